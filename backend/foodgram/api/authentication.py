@@ -0,0 +1,142 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from api.metrics import cache_result
+from recipes.models import User
+
+
+class TokenCache:
+    """Кэш токен -> объект Token с пользователем, с временем жизни.
+
+    Без TOKEN_CACHE_ALIAS записи хранятся в памяти процесса, общей для
+    потоков, и вытесняются по LRU сверх TOKEN_CACHE_SIZE. Отзыв удаляет
+    запись только в своём процессе, поэтому локальные записи живут
+    короткое TOKEN_CACHE_LOCAL_TTL. С TOKEN_CACHE_ALIAS записи хранятся
+    в указанном кэше Django, видны всем процессам и живут TOKEN_CACHE_TTL.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tokens = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def cache_key(key):
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        if settings.TOKEN_CACHE_ALIAS:
+            token = caches[settings.TOKEN_CACHE_ALIAS].get(
+                self.cache_key(key)
+            )
+        else:
+            with self._lock:
+                token, expires = self._tokens.get(key, (None, 0))
+                if token is not None and expires > time.monotonic():
+                    self._tokens.move_to_end(key)
+                else:
+                    token = None
+        cache_result('token', token is not None)
+        with self._lock:
+            if token is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return token
+
+    def set(self, key, token):
+        if settings.TOKEN_CACHE_ALIAS:
+            caches[settings.TOKEN_CACHE_ALIAS].set(
+                self.cache_key(key), token, settings.TOKEN_CACHE_TTL
+            )
+            return
+        with self._lock:
+            self._tokens[key] = (
+                token, time.monotonic() + settings.TOKEN_CACHE_LOCAL_TTL
+            )
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > settings.TOKEN_CACHE_SIZE:
+                self._tokens.popitem(last=False)
+
+    def delete(self, key):
+        if settings.TOKEN_CACHE_ALIAS:
+            caches[settings.TOKEN_CACHE_ALIAS].delete(self.cache_key(key))
+            return
+        with self._lock:
+            self._tokens.pop(key, None)
+
+    def stats(self):
+        """Попадания и промахи в этом процессе, число локальных записей."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._tokens),
+            }
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе для недавних токенов.
+
+    Запись удаляется при удалении токена (выход через djoser) и при
+    любом сохранении пользователя: смене пароля, деактивации, правке
+    профиля. Каждый запрос получает свою копию пользователя.
+
+    Счётчики пользователя меняются UPDATE с F() без сброса записи,
+    поэтому в кэш пользователь попадает без них: отложенные поля при
+    обращении читаются из базы и не записываются save().
+    """
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            for name in User.counter_fields:
+                user.__dict__.pop(name, None)
+            token_cache.set(key, token)
+        token = copy.copy(token)
+        token.user = copy.copy(token.user)
+        return token.user, token
+
+
+def revoke(keys):
+    """Удаляет записи после фиксации транзакции.
+
+    Иначе параллельный запрос успел бы снова закэшировать старые данные.
+    """
+    keys = list(keys)
+
+    def delete():
+        for key in keys:
+            token_cache.delete(key)
+
+    transaction.on_commit(delete)
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    revoke([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, created, **kwargs):
+    if not created:
+        revoke(
+            Token.objects.filter(user=instance)
+            .values_list('key', flat=True)
+        )
@@ -0,0 +1,234 @@
+import base64
+import math
+import shutil
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Recipe, ShoppingCart, Tag, User
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, percent):
+    """Процентиль по ближайшему рангу для отсортированного списка."""
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class QueryTimer:
+    """Обёртка execute_wrapper: число запросов и их суммарное время."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+
+class Scenario:
+    """Запрос к API: имя, метод, путь, тело и ожидаемый статус.
+
+    Пишущие сценарии выполняются в транзакции, которая откатывается,
+    поэтому каждый повтор видит одну и ту же базу.
+    """
+
+    def __init__(self, name, client, method, path, data=None,
+                 status=200, write=False):
+        self.name = name
+        self.client = client
+        self.method = method
+        self.path = path
+        self.data = data
+        self.status = status
+        self.write = write
+
+    def request(self):
+        return getattr(self.client, self.method)(
+            self.path, self.data, format='json'
+        )
+
+    def run_once(self):
+        """Время ответа, число запросов и время SQL одного повтора."""
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            if self.write:
+                with transaction.atomic():
+                    response = self.request()
+                    transaction.set_rollback(True)
+            else:
+                response = self.request()
+            if hasattr(response, 'streaming_content'):
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        if response.status_code != self.status:
+            raise AssertionError(
+                f'{self.name}: статус {response.status_code} вместо '
+                f'{self.status}: {response.content[:200]!r}'
+            )
+        return elapsed, timer.count, timer.seconds
+
+    def run(self, iterations, warmup):
+        for _ in range(warmup):
+            self.run_once()
+        samples = [self.run_once() for _ in range(iterations)]
+        latencies = sorted(elapsed for elapsed, _, _ in samples)
+        result = {
+            f'p{percent}_ms': round(percentile(latencies, percent) * 1000, 3)
+            for percent in PERCENTILES
+        }
+        result['mean_ms'] = round(statistics.mean(latencies) * 1000, 3)
+        result['queries'] = statistics.median_low(
+            count for _, count, _ in samples
+        )
+        result['sql_ms'] = round(
+            statistics.median(seconds for _, _, seconds in samples) * 1000, 3
+        )
+        return result
+
+
+def image_data_uri():
+    content = BytesIO()
+    Image.new('RGB', (64, 64), 'orange').save(content, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        content.getvalue()
+    ).decode()
+
+
+def recipe_body(recipe):
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'tags': list(recipe.tags.values_list('id', flat=True)),
+        'ingredients': [
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in
+            recipe.recipe_ingredients.values_list('ingredient_id', 'amount')
+        ],
+        'image': image_data_uri(),
+    }
+
+
+def client_for(user):
+    client = APIClient()
+    client.force_authenticate(user)
+    return client
+
+
+def build_scenarios(user):
+    """Сценарии для заполненной базы от имени пользователя user.
+
+    Рецепт для правки берётся у самого активного автора, для
+    добавления в избранное и корзину - самый популярный из ещё не
+    добавленных пользователем.
+    """
+    client = client_for(user)
+    anonymous = APIClient()
+    recipe = Recipe.objects.order_by('-favorites_count', 'id').first()
+    own = Recipe.objects.filter(
+        author=User.objects.order_by('-recipes_count', 'id').first()
+    ).order_by('-pub_date').first()
+    target = Recipe.objects.exclude(
+        favorites__user=user
+    ).exclude(shopping_carts__user=user).order_by('-cart_count').first()
+    if None in (recipe, own, target):
+        raise ValueError('В базе нет рецептов, запустите seed_foodgram.')
+    tag = Tag.objects.order_by('-recipes_count').first()
+    ingredient = Ingredient.objects.order_by('-recipes_count').first()
+    word = recipe.name.split()[0]
+    scenarios = [
+        Scenario('recipes-list-anonymous', anonymous, 'get', '/api/recipes/'),
+        Scenario('recipes-list', client, 'get', '/api/recipes/'),
+        Scenario('recipes-list-tags', client, 'get',
+                 f'/api/recipes/?tags={tag.slug}'),
+        Scenario('recipes-list-author', client, 'get',
+                 f'/api/recipes/?author={own.author_id}'),
+        Scenario('recipes-list-favorited', client, 'get',
+                 '/api/recipes/?is_favorited=1'),
+        Scenario('recipes-list-in-cart', client, 'get',
+                 '/api/recipes/?is_in_shopping_cart=1'),
+        Scenario('recipes-list-search', client, 'get',
+                 f'/api/recipes/?search={word}'),
+        Scenario('recipes-list-cursor', client, 'get',
+                 '/api/recipes/?pagination=cursor'),
+        Scenario('recipe-detail', client, 'get',
+                 f'/api/recipes/{recipe.id}/'),
+        Scenario('recipes-feed', client, 'get', '/api/recipes/feed/'),
+        Scenario('subscriptions', client, 'get',
+                 '/api/users/subscriptions/?recipes_limit=3'),
+        Scenario('ingredients-search', anonymous, 'get',
+                 f'/api/ingredients/?name={ingredient.name[:2]}'),
+        Scenario('download-shopping-cart', client, 'get',
+                 '/api/recipes/download_shopping_cart/'),
+        Scenario('recipe-create', client, 'post', '/api/recipes/',
+                 recipe_body(own), status=201, write=True),
+        Scenario('recipe-update', client_for(own.author), 'patch',
+                 f'/api/recipes/{own.id}/', recipe_body(own), write=True),
+        Scenario('favorite-add', client, 'post',
+                 f'/api/recipes/{target.id}/favorite/',
+                 status=201, write=True),
+        Scenario('shopping-cart-add', client, 'post',
+                 f'/api/recipes/{target.id}/shopping_cart/',
+                 status=201, write=True),
+    ]
+    cart = ShoppingCart.objects.filter(user=user).first()
+    if cart is not None:
+        scenarios.append(Scenario(
+            'shopping-cart-remove', client, 'delete',
+            f'/api/recipes/{cart.recipe_id}/shopping_cart/',
+            status=204, write=True,
+        ))
+    return scenarios
+
+
+@contextmanager
+def benchmark_environment():
+    """Тестовый клиент без записи файлов в настоящий MEDIA_ROOT."""
+    media_root = tempfile.mkdtemp()
+    try:
+        with override_settings(
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            MEDIA_ROOT=media_root,
+        ):
+            yield
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+
+
+def compare(results, baseline, margin):
+    """Список регрессий относительно baseline.
+
+    Задержка p95 может вырасти не больше чем на долю margin, число
+    запросов расти не должно.
+    """
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + margin):
+            regressions.append(
+                f'{name}: p95 {current["p95_ms"]} мс, '
+                f'было {base["p95_ms"]} мс'
+            )
+        if current['queries'] > base['queries']:
+            regressions.append(
+                f'{name}: запросов {current["queries"]}, '
+                f'было {base["queries"]}'
+            )
+    return regressions
@@ -0,0 +1,217 @@
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+
+from api.metrics import cache_result
+from recipes.models import Ingredient, Tag
+
+CATALOG_VERSION_KEY = 'catalog-version'
+
+
+def version_timeout():
+    """Время жизни версии: без общего кэша - как у ответа у клиента."""
+    return None if settings.CACHE_SHARED else settings.CATALOG_CACHE_MAX_AGE
+
+
+def catalog_version():
+    """Версия справочников тегов и продуктов.
+
+    Хранится в кэше Django, поэтому общая для всех процессов, если
+    настроен разделяемый бэкенд; иначе истекает, и процесс узнаёт об
+    изменениях в других процессах и командах загрузки с задержкой до
+    CATALOG_CACHE_MAX_AGE. При потере ключа
+    начинается с текущего времени, чтобы не совпасть ни с одной из
+    прежних версий.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(
+            CATALOG_VERSION_KEY, time.time_ns(), timeout=version_timeout()
+        )
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        cache.set(
+            CATALOG_VERSION_KEY, time.time_ns(), timeout=version_timeout()
+        )
+
+
+class IngredientIndex:
+    """Индекс продуктов в памяти процесса для поиска по началу названия.
+
+    Хранит отсортированные по casefold-названию ключи и заранее
+    сериализованные в JSON записи, поэтому запрос отвечается бинарным
+    поиском без обращения к базе данных.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._version = None
+
+    def invalidate(self):
+        with self._lock:
+            self._index = None
+
+    def _build(self):
+        entries = sorted(
+            (name.casefold(), name, id, json.dumps(
+                {'id': id, 'name': name, 'measurement_unit': unit},
+                ensure_ascii=False,
+                separators=(',', ':'),
+            ).encode())
+            for id, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+        return (
+            [key for key, *_ in entries],
+            [item for *_, item in entries],
+        )
+
+    def get_index(self):
+        version = catalog_version()
+        index = self._index
+        if index is None or self._version != version:
+            with self._lock:
+                if self._index is None or self._version != version:
+                    self._index = self._build()
+                    self._version = version
+                index = self._index
+        return index
+
+    def search(self, prefix, limit=None):
+        """JSON-массив продуктов, название которых начинается с prefix."""
+        keys, items = self.get_index()
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        end = start
+        stop = len(keys) if limit is None else min(len(keys), start + limit)
+        while end < stop and keys[end].startswith(prefix):
+            end += 1
+        return b'[' + b','.join(items[start:end]) + b']'
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_ingredients(prefix):
+    return ingredient_index.search(
+        prefix, settings.INGREDIENTS_SEARCH_LIMIT
+    )
+
+
+class CatalogBodyCache:
+    """Локальный LRU-кэш готовых ответов одной версии каталога.
+
+    Значение - (тело, Content-Type, ETag).
+    """
+
+    def __init__(self, max_size):
+        self._lock = threading.Lock()
+        self._max_size = max_size
+        self._version = None
+        self._bodies = OrderedDict()
+
+    def get(self, version, key):
+        with self._lock:
+            if self._version != version:
+                return None
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+            return body
+
+    def set(self, version, key, body):
+        with self._lock:
+            if self._version != version:
+                self._version = version
+                self._bodies.clear()
+            self._bodies[key] = body
+            while len(self._bodies) > self._max_size:
+                self._bodies.popitem(last=False)
+
+
+catalog_body_cache = CatalogBodyCache(settings.CATALOG_BODY_CACHE_SIZE)
+
+
+class CatalogCacheMixin:
+    """HTTP-кэширование справочников.
+
+    Готовые тела ответов хранятся в локальном кэше процесса до смены
+    версии каталога. ETag - хэш тела, поэтому он одинаков во всех
+    процессах и не меняется, пока не изменились данные, даже если
+    версия каталога истекла в кэше процесса. Совпавший If-None-Match
+    для закэшированного тела получает 304 без обращения к базе данных.
+    Справочники не зависят от пользователя, поэтому аутентификация
+    для них отключена.
+    """
+
+    authentication_classes = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.catalog_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.catalog_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def catalog_response(self, handler, request, *args, **kwargs):
+        version = catalog_version()
+        key = (request.get_full_path(), request.accepted_media_type)
+        body = catalog_body_cache.get(version, key)
+        cache_result('catalog', body is not None)
+        if body is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            content, content_type = self.render_body(request, response)
+            body = (
+                content, content_type,
+                '"{}"'.format(hashlib.md5(content).hexdigest()),
+            )
+            catalog_body_cache.set(version, key, body)
+        content, content_type, etag = body
+        if etag in parse_etags(request.headers.get('If-None-Match', '')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.CATALOG_CACHE_MAX_AGE
+        )
+        return response
+
+    def render_body(self, request, response):
+        if not hasattr(response, 'render'):
+            return response.content, response['Content-Type']
+        response.accepted_renderer = request.accepted_renderer
+        response.accepted_media_type = request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+        return response.content, response['Content-Type']
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def catalog_changed(**kwargs):
+    bump_catalog_version()
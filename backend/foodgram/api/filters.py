@@ -1,6 +1,9 @@
 from django_filters.rest_framework import FilterSet, filters
+from rest_framework.filters import OrderingFilter
 
-from recipes.models import Ingredient, Recipe
+from api.membership import get_membership
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from recipes.search import search_recipes
 
 
 class IngredientFilter(FilterSet):
@@ -20,17 +23,35 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author', 'tags', 'is_favorited', 'is_in_shopping_cart', 'search'
+        )
 
-    def get_is_favorited(self, recipes, name, value):
+    def filter_membership(self, recipes, value, model):
         if value and self.request.user.is_authenticated:
-            return recipes.filter(favorites__user=self.request.user)
+            return recipes.filter(
+                id__in=get_membership(self.request).get(model)
+            )
         return recipes
 
+    def get_is_favorited(self, recipes, name, value):
+        return self.filter_membership(recipes, value, Favorite)
+
     def get_is_in_shopping_cart(self, recipes, name, value):
-        if value and self.request.user.is_authenticated:
-            return recipes.filter(shopping_carts__user=self.request.user)
-        return recipes
+        return self.filter_membership(recipes, value, ShoppingCart)
+
+    def get_search(self, recipes, name, value):
+        return search_recipes(recipes, value)
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """Без явного ?ordering= результаты поиска идут по релевантности."""
+
+    def get_default_ordering(self, view):
+        if view.request.query_params.get('search', '').strip():
+            return ('-search_rank', '-pub_date', '-id')
+        return super().get_default_ordering(view)
@@ -0,0 +1,133 @@
+import base64
+import binascii
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from api.metrics import IMAGE_UPLOAD_BYTES
+
+BASE64_MARKER = ';base64,'
+CHUNK_SIZE = 64 * 1024
+# Байтов достаточно для сигнатуры любого из FORMATS.
+SIGNATURE_SIZE = 12
+
+FORMATS = {
+    'PNG': 'png',
+    'JPEG': 'jpg',
+    'GIF': 'gif',
+    'WEBP': 'webp',
+}
+
+
+def sniff_format(head):
+    """Формат изображения по сигнатуре первых байтов."""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'PNG'
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'JPEG'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'GIF'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def base64_chunks(data, start):
+    """Куски base64 без пробельных символов, длиной кратной 4.
+
+    Переносы строк допустимы в base64, поэтому отбрасываются, а
+    остаток куска переносится в следующий. Последний кусок отдаётся
+    как есть, и неполная группа в нём - ошибка декодирования.
+    """
+    rest = ''
+    for position in range(start, len(data), CHUNK_SIZE):
+        chunk = rest + ''.join(data[position:position + CHUNK_SIZE].split())
+        end = len(chunk) - len(chunk) % 4
+        rest = chunk[end:]
+        if end:
+            yield chunk[:end]
+    if rest:
+        yield rest
+
+
+def write_decoded(data, start, file):
+    """Декодирует base64 кусками в file; возвращает формат и размер."""
+    image_format = None
+    head = b''
+    size = 0
+    for chunk in base64_chunks(data, start):
+        try:
+            chunk = base64.b64decode(chunk, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValidationError('Некорректные данные base64.')
+        if image_format is None and len(head) < SIGNATURE_SIZE:
+            head += chunk[:SIGNATURE_SIZE]
+            if len(head) >= SIGNATURE_SIZE:
+                image_format = check_format(head)
+        file.write(chunk)
+        size += len(chunk)
+    if not size:
+        raise ValidationError('Пустое изображение.')
+    if image_format is None:
+        image_format = check_format(head)
+    return image_format, size
+
+
+def check_format(head):
+    image_format = sniff_format(head)
+    if image_format is None:
+        raise ValidationError('Неподдерживаемый формат изображения.')
+    return image_format
+
+
+def check_image(file, image_format):
+    """Проверяет число пикселей по заголовку и целостность файла."""
+    file.seek(0)
+    try:
+        image = Image.open(file, formats=(image_format,))
+    except Exception:
+        raise ValidationError('Файл не является корректным изображением.')
+    with image:
+        width, height = image.size
+        if width * height > settings.IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                f'Изображение больше {settings.IMAGE_MAX_PIXELS} пикселей.'
+            )
+        try:
+            image.verify()
+        except Exception:
+            raise ValidationError('Файл не является корректным изображением.')
+    file.seek(0)
+
+
+def decode_base64_image(data):
+    """Декодирует data-URI с изображением во временный файл.
+
+    Base64 декодируется кусками в SpooledTemporaryFile, поэтому в памяти
+    нет полной копии двоичных данных. Размер в байтах проверяется до
+    декодирования, число пикселей - по заголовку до разбора пикселей,
+    формат определяется по сигнатуре, а не по типу из data-URI.
+    """
+    start = data.find(BASE64_MARKER)
+    if start == -1:
+        raise ValidationError('Изображение должно быть закодировано в base64.')
+    start += len(BASE64_MARKER)
+    if (len(data) - start) // 4 * 3 > settings.IMAGE_MAX_BYTES:
+        raise ValidationError(
+            f'Размер изображения больше {settings.IMAGE_MAX_BYTES} байт.'
+        )
+    file = tempfile.SpooledTemporaryFile(max_size=settings.IMAGE_SPOOL_SIZE)
+    try:
+        image_format, size = write_decoded(data, start, file)
+        check_image(file, image_format)
+    except Exception:
+        file.close()
+        raise
+    image = File(file, name=f'{uuid.uuid4().hex}.{FORMATS[image_format]}')
+    image.size = size
+    IMAGE_UPLOAD_BYTES.labels(FORMATS[image_format]).observe(size)
+    return image
@@ -0,0 +1,107 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmark import (benchmark_environment, build_scenarios, compare,
+                           PERCENTILES)
+from recipes.models import Recipe, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет задержку (p50/p95/p99), число и время SQL-запросов '
+        'основных запросов API на заполненной базе (seed_foodgram) и '
+        'сравнивает результат с сохранённым базовым.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=50,
+            help='Сколько раз выполнить каждый запрос.',
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Сколько прогревочных запросов не учитывать.',
+        )
+        parser.add_argument(
+            '--user',
+            help='Логин пользователя; по умолчанию - с наибольшим '
+                 'числом подписок.',
+        )
+        parser.add_argument(
+            '--only', nargs='+', metavar='NAME',
+            help='Выполнить только сценарии с этими именами.',
+        )
+        parser.add_argument(
+            '--output', help='Файл для результатов в формате JSON.',
+        )
+        parser.add_argument(
+            '--baseline', help='Файл с базовыми результатами для сравнения.',
+        )
+        parser.add_argument(
+            '--margin', type=float, default=0.2,
+            help='Допустимый рост p95 относительно базового, доля.',
+        )
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+        else:
+            user = User.objects.order_by('-subscriptions_count', 'id').first()
+        if user is None:
+            raise CommandError('Пользователь не найден.')
+        results = {}
+        with benchmark_environment():
+            try:
+                scenarios = build_scenarios(user)
+            except ValueError as error:
+                raise CommandError(error)
+            for scenario in scenarios:
+                if options['only'] and scenario.name not in options['only']:
+                    continue
+                try:
+                    result = scenario.run(
+                        options['iterations'], options['warmup']
+                    )
+                except AssertionError as error:
+                    raise CommandError(error)
+                results[scenario.name] = result
+                print(
+                    f'{scenario.name:<28}'
+                    + ''.join(
+                        f' p{percent} {result[f"p{percent}_ms"]:8.2f} мс'
+                        for percent in PERCENTILES
+                    )
+                    + f'  SQL {result["queries"]:3} '
+                    f'({result["sql_ms"]:.2f} мс)'
+                )
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump({
+                    'meta': {
+                        'date': timezone.now().isoformat(),
+                        'database': connection.vendor,
+                        'user': user.username,
+                        'users': User.objects.count(),
+                        'recipes': Recipe.objects.count(),
+                        'iterations': options['iterations'],
+                    },
+                    'results': results,
+                }, file, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as file:
+                    baseline = json.load(file)['results']
+            except (OSError, ValueError, KeyError) as error:
+                raise CommandError(
+                    f'Ошибка при чтении {options["baseline"]}: {error}'
+                )
+            regressions = compare(results, baseline, options['margin'])
+            if regressions:
+                raise CommandError(
+                    'Регрессия производительности:\n'
+                    + '\n'.join(regressions)
+                )
+            print('Регрессий относительно базовых результатов нет.')
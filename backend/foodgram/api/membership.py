@@ -0,0 +1,126 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.metrics import cache_result
+from recipes.models import Favorite, ShoppingCart, Subscribe
+
+KINDS = {
+    Favorite: ('favorites', 'recipe_id'),
+    ShoppingCart: ('cart', 'recipe_id'),
+    Subscribe: ('following', 'author_id'),
+}
+
+
+def version_key(kind, user_id):
+    return f'membership-version:{kind}:{user_id}'
+
+
+def version_timeout():
+    if settings.CACHE_SHARED:
+        return None
+    return settings.MEMBERSHIP_CACHE_LOCAL_TTL
+
+
+def membership_version(kind, user_id):
+    """Версия множества пользователя, меняется при каждом изменении.
+
+    При потере ключа начинается с текущего времени, как версия каталога.
+    """
+    key = version_key(kind, user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=version_timeout())
+        version = cache.get(key)
+    return version
+
+
+def bump_membership_version(kind, user_id):
+    if not settings.MEMBERSHIP_CACHE_TIMEOUT:
+        return
+    key = version_key(kind, user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), timeout=version_timeout())
+
+
+class Membership:
+    """Id избранных рецептов, рецептов в корзине и авторов в подписках.
+
+    Каждое множество загружается одним запросом при первом обращении и
+    живёт до конца запроса. При MEMBERSHIP_CACHE_TIMEOUT множества
+    хранятся и в кэше Django под ключом с версией, поэтому изменение
+    делает прежнюю запись недоступной для всех процессов (без общего
+    кэша - через MEMBERSHIP_CACHE_LOCAL_TTL секунд).
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.sets = {}
+
+    def get(self, model):
+        if not self.user.is_authenticated:
+            return frozenset()
+        kind, field = KINDS[model]
+        if kind not in self.sets:
+            self.sets[kind] = self.load(model, kind, field)
+        return self.sets[kind]
+
+    def load(self, model, kind, field):
+        timeout = settings.MEMBERSHIP_CACHE_TIMEOUT
+        if timeout:
+            key = 'membership:{}:{}:{}'.format(
+                kind, self.user.pk, membership_version(kind, self.user.pk)
+            )
+            ids = cache.get(key)
+            cache_result('membership', ids is not None)
+            if ids is not None:
+                return set(ids)
+        ids = set(
+            model.objects.filter(user=self.user)
+            .values_list(field, flat=True)
+        )
+        if timeout:
+            cache.set(key, ids, timeout)
+        return ids
+
+    def add(self, model, pk):
+        kind, _ = KINDS[model]
+        if kind in self.sets:
+            self.sets[kind].add(pk)
+
+    def discard(self, model, pk):
+        kind, _ = KINDS[model]
+        if kind in self.sets:
+            self.sets[kind].discard(pk)
+
+
+def get_membership(request):
+    """Membership пользователя запроса, один объект на запрос."""
+    membership = getattr(request, '_membership', None)
+    if membership is None:
+        membership = request._membership = Membership(request.user)
+    return membership
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscribe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscribe)
+def membership_changed(sender, instance, **kwargs):
+    """Меняет версию сразу и ещё раз после фиксации транзакции.
+
+    Иначе запрос, прочитавший базу до фиксации, сохранил бы под новой
+    версией старые данные.
+    """
+    kind, _ = KINDS[sender]
+    user_id = instance.user_id
+    bump_membership_version(kind, user_id)
+    transaction.on_commit(lambda: bump_membership_version(kind, user_id))
@@ -0,0 +1,120 @@
+import ipaddress
+import os
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+# Несколько процессов gunicorn пишут значения в файлы этого каталога,
+# а /metrics собирает их вместе.
+MULTIPROC_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+REQUESTS = Counter(
+    'foodgram_http_requests',
+    'Запросы по представлениям.',
+    ['view', 'method', 'status'],
+)
+REQUEST_DURATION = Histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время ответа.',
+    ['view', 'method'],
+    buckets=(
+        0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    ),
+)
+REQUEST_QUERIES = Histogram(
+    'foodgram_db_queries_per_request',
+    'Число SQL-запросов на один запрос.',
+    ['view', 'method'],
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200),
+)
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests',
+    'Обращения к кэшам приложения: попадания и промахи.',
+    ['cache', 'result'],
+)
+IMAGE_UPLOAD_BYTES = Histogram(
+    'foodgram_image_upload_bytes',
+    'Размер загруженных изображений после декодирования base64.',
+    ['format'],
+    buckets=tuple(2 ** power for power in range(14, 25)),
+)
+
+
+def cache_result(name, hit):
+    CACHE_REQUESTS.labels(name, 'hit' if hit else 'miss').inc()
+
+
+class QueryCounter:
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class MetricsMiddleware:
+    """Число, время ответа и число SQL-запросов по представлениям.
+
+    Представление - имя маршрута, для DRF оно включает действие
+    (api:recipes-list, api:recipes-favorite). Включается настройкой
+    METRICS.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+        REQUEST_DURATION.labels(view, request.method).observe(
+            time.perf_counter() - started
+        )
+        REQUEST_QUERIES.labels(view, request.method).observe(queries.count)
+        return response
+
+
+def client_allowed(address):
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network.strip(), strict=False)
+        for network in settings.METRICS_ALLOWED_IPS
+        if network.strip()
+    )
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus для адресов из списка."""
+    if not settings.METRICS:
+        raise Http404
+    if not client_allowed(request.META.get('REMOTE_ADDR', '')):
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
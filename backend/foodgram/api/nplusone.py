@@ -0,0 +1,140 @@
+import logging
+import os
+import re
+import sys
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.contrib.admin.options import BaseModelAdmin
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.fields import Field
+
+logger = logging.getLogger(__name__)
+
+STACK_DEPTH = 5
+HEADER_SQL_LENGTH = 100
+
+
+class NPlusOneError(Exception):
+    """Один и тот же запрос выполнен в одном запросе API слишком часто."""
+
+
+def fingerprint(sql):
+    """Шаблон запроса: без литералов и с одним элементом в списках IN."""
+    sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+    sql = re.sub(r'\b\d+\b', '?', sql)
+    sql = re.sub(r'%s', '?', sql)
+    sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', sql)
+    return re.sub(r'\s+', ' ', sql).strip()
+
+
+def attribute(frame):
+    """Поле сериализатора или метод админки и строки кода проекта.
+
+    Поле - ближайший к запросу кадр, где self - поле DRF с именем
+    (вложенный сериализатор тоже поле), метод админки - кадр, где self
+    наследник ModelAdmin.
+    """
+    source = None
+    stack = []
+    root = str(settings.BASE_DIR) + os.sep
+    while frame is not None:
+        code = frame.f_code
+        owner = frame.f_locals.get('self')
+        if source is None:
+            if isinstance(owner, Field) and owner.field_name:
+                source = f'{type(owner.parent).__name__}.{owner.field_name}'
+            elif isinstance(owner, BaseModelAdmin):
+                source = f'{type(owner).__name__}.{code.co_name}'
+        if (
+            code.co_filename.startswith(root)
+            and code.co_filename != __file__
+            and len(stack) < STACK_DEPTH
+        ):
+            stack.append(
+                f'{os.path.relpath(code.co_filename, root)}:'
+                f'{frame.f_lineno} in {code.co_name}'
+            )
+        frame = frame.f_back
+    return source, stack
+
+
+class QueryPatterns:
+    """Счётчик шаблонов SQL для execute_wrapper.
+
+    Когда шаблон выполняется больше threshold раз, запоминается, какой
+    код его вызвал: стек снимается один раз на шаблон.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.counts = Counter()
+        self.sources = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        template = fingerprint(sql)
+        self.counts[template] += 1
+        if (
+            self.counts[template] > self.threshold
+            and template not in self.sources
+        ):
+            self.sources[template] = attribute(sys._getframe(1))
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        """Список (шаблон, число, источник, стек) по убыванию числа."""
+        return [
+            (template, self.counts[template], *self.sources[template])
+            for template in sorted(
+                self.sources, key=self.counts.get, reverse=True
+            )
+        ]
+
+
+def report(repeated):
+    return '\n'.join(
+        f'{count} x {template}\n'
+        f'    источник: {source or "не определён"}\n'
+        + ''.join(f'    {line}\n' for line in stack)
+        for template, count, source, stack in repeated
+    )
+
+
+class NPlusOneMiddleware:
+    """Поиск N+1 для разработки и тестов.
+
+    Включается настройкой NPLUSONE: 'warn' добавляет к ответу заголовок
+    X-NPlusOne и пишет подробности в лог, 'raise' выбрасывает
+    NPlusOneError, из-за которого падает тест.
+    """
+
+    def __init__(self, get_response):
+        if settings.NPLUSONE not in ('warn', 'raise'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        patterns = QueryPatterns(settings.NPLUSONE_THRESHOLD)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(patterns))
+            response = self.get_response(request)
+        repeated = patterns.repeated()
+        if not repeated or response.status_code >= 500:
+            # Страница ошибки сама выполняет запросы, выводя переменные,
+            # а исходное исключение важнее.
+            return response
+        message = f'{request.method} {request.path}:\n{report(repeated)}'
+        if settings.NPLUSONE == 'raise':
+            raise NPlusOneError(message)
+        logger.warning('Повторяющиеся запросы в %s', message)
+        response['X-NPlusOne'] = '; '.join(
+            f'{count} x {source or "?"}: '
+            f'{template[:HEADER_SQL_LENGTH]}'.encode(
+                'ascii', 'replace'
+            ).decode()
+            for template, count, source, _ in repeated
+        )
+        return response
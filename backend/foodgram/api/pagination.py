@@ -1,6 +1,91 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorPaginatorWithLimit(CursorPagination):
+    """Курсорная (keyset) пагинация для бесконечной ленты.
+
+    По умолчанию упорядочивает по (pub_date, id); представление может
+    задать свой порядок атрибутом cursor_ordering.
+    """
+
+    page_size_query_param = 'limit'
+    ordering = ('-pub_date', '-id')
+
+    def get_ordering(self, request, queryset, view):
+        if any(
+            issubclass(backend, OrderingFilter)
+            for backend in getattr(view, 'filter_backends', ())
+        ):
+            return super().get_ordering(request, queryset, view)
+        return getattr(view, 'cursor_ordering', self.ordering)
 
 
 class PaginatorWithLimit(PageNumberPagination):
+    """Постраничная пагинация с параметром limit.
+
+    Параметр pagination включает другие режимы: cursor - курсорную
+    пагинацию без COUNT и OFFSET, nocount - постраничную без COUNT.
+    """
 
     page_size_query_param = 'limit'
+    mode_query_param = 'pagination'
+    cursor_pagination_class = CursorPaginatorWithLimit
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.mode = request.query_params.get(self.mode_query_param)
+        if self.mode == 'cursor':
+            self.cursor_paginator = self.cursor_pagination_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        if self.mode == 'nocount':
+            return self.paginate_without_count(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        try:
+            page_number = int(
+                request.query_params.get(self.page_query_param, 1)
+            )
+        except ValueError:
+            page_number = 0
+        if page_number < 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='Неверный номер страницы.'
+            ))
+        offset = (page_number - 1) * page_size
+        items = list(queryset[offset:offset + page_size + 1])
+        if page_number > 1 and not items:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message='Страница пуста.'
+            ))
+        self.request = request
+        self.page_number = page_number
+        self.has_next = len(items) > page_size
+        return items[:page_size]
+
+    def get_paginated_response(self, data):
+        if self.mode == 'cursor':
+            return self.cursor_paginator.get_paginated_response(data)
+        if self.mode == 'nocount':
+            return Response({
+                'next': self.get_nocount_link(self.page_number + 1)
+                if self.has_next else None,
+                'previous': self.get_nocount_link(self.page_number - 1)
+                if self.page_number > 1 else None,
+                'results': data,
+            })
+        return super().get_paginated_response(data)
+
+    def get_nocount_link(self, page_number):
+        url = self.request.build_absolute_uri()
+        if page_number == 1:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, page_number)
@@ -0,0 +1,179 @@
+import cProfile
+import json
+import logging
+import os
+import random
+import re
+import time
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from rest_framework.generics import GenericAPIView
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class RequestProfile:
+    """Время этапов одного запроса, число и время SQL-запросов."""
+
+    def __init__(self):
+        self.phases = {}
+        self.active = set()
+        self.queries = 0
+        self.db_seconds = 0.0
+
+    @contextmanager
+    def phase(self, name):
+        """Замер этапа; вложенные замеры того же этапа не учитываются."""
+        if name in self.active:
+            yield
+            return
+        self.active.add(name)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = (
+                self.phases.get(name, 0.0) + time.perf_counter() - started
+            )
+            self.active.discard(name)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_seconds += time.perf_counter() - started
+            self.queries += 1
+
+    def server_timing(self, total):
+        metrics = [
+            f'db;dur={self.db_seconds * 1000:.1f};desc="{self.queries} SQL"'
+        ]
+        metrics += [
+            f'{name};dur={seconds * 1000:.1f}'
+            for name, seconds in self.phases.items()
+        ]
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+def timed(name, function):
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return function(*args, **kwargs)
+        with profile.phase(name):
+            return function(*args, **kwargs)
+    return wrapper
+
+
+def install():
+    """Подключает замеры фильтрации, пагинации и сериализации DRF.
+
+    Обёртки ставятся на базовые классы, поэтому охватывают и
+    представления djoser. Вне профилируемого запроса они ничего не
+    делают.
+    """
+    GenericAPIView.filter_queryset = timed(
+        'filter', GenericAPIView.filter_queryset
+    )
+    GenericAPIView.paginate_queryset = timed(
+        'paginate', GenericAPIView.paginate_queryset
+    )
+    BaseSerializer.data = property(timed(
+        'serialize', BaseSerializer.data.fget
+    ))
+
+
+class ProfilingMiddleware:
+    """Заголовок Server-Timing и строка лога с этапами каждого запроса.
+
+    Включается настройкой PROFILING. Дамп cProfile сохраняется в
+    PROFILING_DIR для доли PROFILING_SAMPLE_RATE процентов запросов и
+    для запросов дольше PROFILING_SLOW_MS; с порогом профилировщик
+    работает в каждом запросе, а дамп остаётся только у медленных.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        sampled = random.random() * 100 < settings.PROFILING_SAMPLE_RATE
+        profiler = None
+        if sampled or settings.PROFILING_SLOW_MS:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Профилировщик уже запущен в другом потоке.
+                profiler = None
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            total = time.perf_counter() - started
+            if profiler is not None:
+                profiler.disable()
+            current_profile.reset(token)
+        response['Server-Timing'] = profile.server_timing(total)
+        if profiler is not None and (
+            sampled or total * 1000 >= settings.PROFILING_SLOW_MS
+        ):
+            self.dump(profiler, request, total)
+        self.log(request, response, profile, total)
+        return response
+
+    def process_template_response(self, request, response):
+        """Замер отрисовки ответа DRF, которая идёт после этого метода."""
+        profile = current_profile.get()
+        if profile is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                profile.phases['render'] = time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    @staticmethod
+    def dump(profiler, request, total):
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        name = re.sub(r'[^\w-]+', '_', request.path).strip('_') or 'root'
+        profiler.dump_stats(os.path.join(
+            settings.PROFILING_DIR,
+            f'{time.strftime("%Y%m%d-%H%M%S")}-{os.getpid()}-'
+            f'{request.method}-{name}-{total * 1000:.0f}ms.prof'
+        ))
+
+    @staticmethod
+    def log(request, response, profile, total):
+        match = request.resolver_match
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(profile.db_seconds * 1000, 1),
+            'queries': profile.queries,
+            **{
+                f'{name}_ms': round(seconds * 1000, 1)
+                for name, seconds in profile.phases.items()
+            },
+        }))
@@ -1,6 +1,10 @@
+import csv
+import json
 import locale
 from datetime import datetime
 
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
 
 locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
 
@@ -9,34 +13,100 @@ PRODUCT = '{count} {name} - {amount}/{unit}'
 RECIPE = '{count} {name} от {username}'
 
 
-def cart_render(ingredients, recipes):
-    date = datetime.now().strftime('%Y-%B-%d')
-    list_header = f'Список покупок от: {date}'
-    ingredient_header = 'Список продуктов:'
-    recipe_header = 'Для рецептов:'
-    products_list = [(
-        PRODUCT.format(
+class TextRenderer(BaseRenderer):
+    """Рендерер для выгрузок, которые отдаются потоком.
+
+    Сами выгрузки формируются генераторами ниже, а рендерер нужен для
+    выбора формата через ?format= и для ответов с ошибками.
+    """
+
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, bytes):
+            return data
+        if not isinstance(data, str):
+            data = json.dumps(data, ensure_ascii=False)
+        return data.encode(self.charset)
+
+
+class PlainTextRenderer(TextRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVRenderer(TextRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+CART_RENDERERS = (PlainTextRenderer, CSVRenderer, JSONRenderer)
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def cart_render_txt(ingredients, recipes, date):
+    yield f'Список покупок от: {date}\n'
+    yield 'Список продуктов:\n'
+    for i, (name, unit, amount) in enumerate(ingredients, start=1):
+        yield PRODUCT.format(
             count=i,
-            name=ingredient['ingredient__name'].capitalize(),
-            amount=ingredient['amount'],
-            unit=ingredient['ingredient__measurement_unit']
+            name=name.capitalize(),
+            amount=amount,
+            unit=unit
+        ) + '\n'
+    yield 'Для рецептов:\n'
+    for i, (name, username) in enumerate(recipes, start=1):
+        yield RECIPE.format(count=i, name=name, username=username) + '\n'
+
+
+def cart_render_csv(ingredients, recipes, date):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Список покупок от', date))
+    yield writer.writerow(('Продукт', 'Количество', 'Единица измерения'))
+    for name, unit, amount in ingredients:
+        yield writer.writerow((name.capitalize(), amount, unit))
+    yield writer.writerow(('Рецепт', 'Автор'))
+    for name, username in recipes:
+        yield writer.writerow((name, username))
+
+
+def cart_render_json(ingredients, recipes, date):
+    yield '{"date":%s,"ingredients":[' % json.dumps(date, ensure_ascii=False)
+    separator = ''
+    for name, unit, amount in ingredients:
+        yield separator + json.dumps(
+            {'name': name, 'measurement_unit': unit, 'amount': amount},
+            ensure_ascii=False
         )
-    )
-        for i, ingredient in enumerate(ingredients, start=1)
-    ]
-    recipes_list = [(
-        RECIPE.format(
-            count=i,
-            name=recipe.recipe.name,
-            username=recipe.recipe.author.username
+        separator = ','
+    yield '],"recipes":['
+    separator = ''
+    for name, username in recipes:
+        yield separator + json.dumps(
+            {'name': name, 'author': username}, ensure_ascii=False
         )
-    )
-        for i, recipe in enumerate(recipes, start=1)
-    ]
-    return '\n'.join([
-        list_header,
-        ingredient_header,
-        *products_list,
-        recipe_header,
-        *recipes_list
-    ])
+        separator = ','
+    yield ']}'
+
+
+CART_FORMATS = {
+    'txt': cart_render_txt,
+    'csv': cart_render_csv,
+    'json': cart_render_json,
+}
+
+
+def cart_render(ingredients, recipes, format='txt'):
+    """Генератор списка покупок в формате txt, csv или json.
+
+    ingredients - итерируемое из кортежей (название, единица, количество),
+    recipes - из кортежей (название рецепта, логин автора).
+    """
+    date = datetime.now().strftime('%Y-%B-%d')
+    return CART_FORMATS[format](ingredients, recipes, date)
@@ -1,12 +1,20 @@
-import base64
 from collections import Counter
 
-from django.core.files.base import ContentFile
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField, IntegerField
-
+from rest_framework.relations import MANY_RELATION_KWARGS, ManyRelatedField
+
+from api.images import decode_base64_image
+from api.membership import get_membership
+from recipes import shopping_list
+from recipes.counters import changed_recipe_ingredients
+from recipes.deletion import delete_handled
+from recipes.renditions import ready_rendition
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Subscribe, Tag, User)
 
@@ -15,22 +23,39 @@ class Base64ImageField(serializers.ImageField):
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            return decode_base64_image(data)
         return super().to_internal_value(data)
 
 
+class RenditionImageField(serializers.ImageField):
+    """Изображение с выбором размера через ?image_size=.
+
+    Пока копия нужного размера не создана, отдаётся оригинал.
+    """
+
+    def to_representation(self, value):
+        request = self.context.get('request')
+        size = request.query_params.get('image_size') if request else None
+        name = ready_rendition(value, size) if size else None
+        if name is None:
+            return super().to_representation(value)
+        url = value.storage.url(name)
+        if request is not None:
+            return request.build_absolute_uri(url)
+        return url
+
+
 class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ('id', 'name', 'slug')
 
 
 class FoodgramUserSerializer(UserSerializer):
 
     is_subscribed = SerializerMethodField(read_only=True)
+    avatar = RenditionImageField(required=False)
 
     class Meta(UserSerializer.Meta):
         fields = (
@@ -38,10 +63,8 @@ class FoodgramUserSerializer(UserSerializer):
         )
 
     def get_is_subscribed(self, author):
-        user = self.context['request'].user
-        return (
-            user.is_authenticated
-            and Subscribe.objects.filter(user=user, author=author).exists()
+        return author.pk in get_membership(self.context['request']).get(
+            Subscribe
         )
 
 
@@ -49,7 +72,7 @@ class IngredientSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ingredient
-        fields = '__all__'
+        fields = ('id', 'name', 'measurement_unit')
 
 
 class RecipeIngredientViewSerializer(serializers. ModelSerializer):
@@ -88,6 +111,7 @@ class RecipeViewSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField(
         read_only=True,
     )
+    image = RenditionImageField(read_only=True)
 
     class Meta:
         model = Recipe
@@ -105,10 +129,8 @@ class RecipeViewSerializer(serializers.ModelSerializer):
         )
 
     def calculation_fields(self, recipe, model):
-        user = self.context.get('request').user
-        return (
-            user.is_authenticated
-            and model.objects.filter(user=user, recipe=recipe).exists()
+        return recipe.pk in get_membership(self.context['request']).get(
+            model
         )
 
     def get_is_favorited(self, recipe):
@@ -118,20 +140,91 @@ class RecipeViewSerializer(serializers.ModelSerializer):
         return self.calculation_fields(recipe, ShoppingCart)
 
 
+class BulkManyRelatedField(ManyRelatedField):
+    """Список ключей, которые разрешаются одним запросом IN.
+
+    Все неизвестные ключи возвращаются в одной ошибке.
+    """
+
+    def to_internal_value(self, data):
+        pks = super().to_internal_value(data)
+        objects = self.child_relation.resolve(pks)
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            raise ValidationError([
+                self.child_relation.does_not_exist(pk) for pk in missing
+            ])
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Первичный ключ, объект для которого ищет владелец списка.
+
+    Сам ключ проверяется только по типу, без запроса к базе.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.get_queryset().model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+    def resolve(self, pks):
+        """{ключ: объект} для всех ключей одним запросом."""
+        return self.get_queryset().in_bulk(set(pks))
+
+    def does_not_exist(self, pk):
+        return self.error_messages['does_not_exist'].format(pk_value=pk)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class IngredientListSerializer(serializers.ListSerializer):
+    """Продукты рецепта: все id разрешаются одним запросом."""
+
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        field = self.child.fields['id']
+        objects = field.resolve(item['id'] for item in items)
+        errors = [
+            {} if item['id'] in objects
+            else {'id': [field.does_not_exist(item['id'])]}
+            for item in items
+        ]
+        if any(errors):
+            raise ValidationError(errors)
+        for item in items:
+            item['id'] = objects[item['id']]
+        return items
+
+
 class IngredientCreateSerializer(serializers.ModelSerializer):
 
-    id = serializers.PrimaryKeyRelatedField(
+    id = BulkPrimaryKeyRelatedField(
         queryset=Ingredient.objects.all(),
     )
 
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'amount')
+        list_serializer_class = IngredientListSerializer
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
     ingredients = IngredientCreateSerializer(many=True)
+    tags = BulkPrimaryKeyRelatedField(
+        queryset=Tag.objects.all(),
+        many=True,
+    )
     image = Base64ImageField()
 
     class Meta:
@@ -175,13 +268,59 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         return self.field_validate(tags, 'Тэг')
 
     def create_ingredients(self, recipe, ingredients):
+        if not ingredients:
+            return
         recipe_ingredients = [RecipeIngredient(
             recipe=recipe,
             ingredient=ingredient['id'],
             amount=ingredient['amount']
         ) for ingredient in ingredients]
         RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        changed_recipe_ingredients(
+            [ingredient['id'].id for ingredient in ingredients], 1
+        )
 
+    def update_ingredients(self, recipe, ingredients):
+        """Меняет только добавленные, изменённые и удалённые продукты.
+
+        Возвращает старый и новый состав рецепта: {ingredient_id: amount}.
+        Удалённые строки обработчики сигналов пропускают, их учитывает
+        один пересчёт счётчиков здесь и один change_recipe по результату.
+        """
+        rows = {
+            row.ingredient_id: row
+            for row in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        new_amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        old_amounts = {
+            ingredient_id: row.amount for ingredient_id, row in rows.items()
+        }
+        removed = [
+            ingredient_id for ingredient_id in rows
+            if ingredient_id not in new_amounts
+        ]
+        if removed:
+            delete_handled(RecipeIngredient.objects.filter(
+                pk__in=[rows[ingredient_id].pk for ingredient_id in removed]
+            ))
+            changed_recipe_ingredients(removed, -1)
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            row = rows.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        self.create_ingredients(recipe, [
+            ingredient for ingredient in ingredients
+            if ingredient['id'].id not in rows
+        ])
+        return old_amounts, new_amounts
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
@@ -190,16 +329,28 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         self.create_ingredients(recipe, ingredients)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         ingredients = validated_data.pop('ingredients')
-        tags = validated_data.pop('tags')
-        instance.tags.clear()
-        instance.tags.set(tags)
-        instance.recipe_ingredients.all().delete()
-        self.create_ingredients(instance, ingredients)
-        return super().update(instance, validated_data)
+        instance.tags.set(validated_data.pop('tags'))
+        shopping_list.change_recipe(
+            instance, *self.update_ingredients(instance, ingredients)
+        )
+        changed = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in changed:
+            setattr(instance, field, validated_data[field])
+        if changed:
+            instance.save(update_fields=changed)
+        return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient'),
+        ))
         return RecipeViewSerializer(
             instance,
             context=self.context
@@ -207,6 +358,9 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
 
 
 class UserRecipeSerializer(serializers.ModelSerializer):
+
+    image = RenditionImageField(read_only=True)
+
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
@@ -225,7 +379,7 @@ class AvatarSerializer(serializers.ModelSerializer):
 class SubscribersViewSerializer(FoodgramUserSerializer):
 
     recipes = SerializerMethodField()
-    recipes_count = IntegerField(source='recipes.count', read_only=True)
+    recipes_count = IntegerField(read_only=True)
 
     class Meta(FoodgramUserSerializer.Meta):
         fields = (
@@ -236,11 +390,6 @@ class SubscribersViewSerializer(FoodgramUserSerializer):
         read_only_fields = fields
 
     def get_recipes(self, user):
-        recipes_limit = int(
-            self.context['request'].query_params.get('recipes_limit', 10**10)
-        )
-        serializer = UserRecipeSerializer(
-            user.recipes.all()[: recipes_limit],
-            many=True, context=self.context
-        )
-        return serializer.data
+        return UserRecipeSerializer(
+            user.short_recipes, many=True, context=self.context
+        ).data
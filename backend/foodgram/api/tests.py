@@ -0,0 +1,391 @@
+import base64
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from api.authentication import token_cache
+from api.catalog import CATALOG_VERSION_KEY
+from api.images import CHUNK_SIZE, decode_base64_image
+from recipes import shopping_list
+from recipes.counters import reconcile
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingListItem, Subscribe, Tag,
+                            User)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def image_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (2, 2), 'white').save(buffer, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class CountersSaveTest(APITestCase):
+    """Сохранение объекта целиком не затирает счётчики."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password',
+        )
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+        )
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def test_avatar_keeps_subscriptions_count(self):
+        # Первый запрос кэширует пользователя с нулевыми счётчиками.
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        response = self.client.post(f'/api/users/{self.author.id}/subscribe/')
+        self.assertEqual(response.status_code, 201)
+        response = self.client.put(
+            '/api/users/me/avatar/', {'avatar': image_base64()},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.user.subscriptions_count, 1)
+        self.assertEqual(self.author.subscribers_count, 1)
+
+    def test_cached_user_without_counters(self):
+        Subscribe.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        token = token_cache.get(self.user.auth_token.key)
+        self.assertTrue(
+            set(User.counter_fields) <= token.user.get_deferred_fields()
+        )
+        Subscribe.objects.create(user=self.author, author=self.user)
+        self.assertEqual(token.user.subscriptions_count, 1)
+        self.assertEqual(token.user.subscribers_count, 1)
+
+    def test_full_save_keeps_counters(self):
+        recipe = Recipe.objects.create(
+            author=self.author, name='рецепт', text='текст',
+            cooking_time=10, image='recipes/recipe.png',
+        )
+        author = User.objects.get(pk=self.author.pk)
+        Favorite.objects.create(user=self.user, recipe=recipe)
+        recipe.name = 'новое название'
+        recipe.save()
+        author.first_name = 'Автор'
+        author.save()
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.name, 'новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(author.first_name, 'Автор')
+        self.assertEqual(author.recipes_count, 1)
+
+    def test_counters_match_data(self):
+        tag = Tag.objects.create(name='тег', slug='tag')
+        ingredient = Ingredient.objects.create(
+            name='продукт', measurement_unit='г',
+        )
+        recipes = []
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                author=self.author, name=f'рецепт{number}', text='текст',
+                cooking_time=10, image='recipes/recipe.png',
+            )
+            recipe.tags.set([tag])
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1,
+            )
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+            recipes.append(recipe)
+        Subscribe.objects.create(user=self.user, author=self.author)
+        Favorite.objects.filter(recipe=recipes[0]).delete()
+        recipes[1].delete()
+        Subscribe.objects.all().delete()
+        self.assertEqual(set(reconcile().values()), {0})
+        recipes[2].refresh_from_db()
+        self.assertEqual(recipes[2].favorites_count, 1)
+        self.assertEqual(recipes[2].cart_count, 1)
+
+
+class CountersDeleteTest(APITestCase):
+    """Каскадное удаление не обновляет счётчики удаляемых объектов."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+        )
+        self.users = [
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+            )
+            for number in range(6)
+        ]
+
+    def delete_queries(self, followers):
+        recipe = Recipe.objects.create(
+            author=self.author, name='рецепт', text='текст',
+            cooking_time=10, image='recipes/recipe.png',
+        )
+        for user in self.users[:followers]:
+            Favorite.objects.create(user=user, recipe=recipe)
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+        with CaptureQueriesContext(connection) as context:
+            recipe.delete()
+        return len(context)
+
+    def test_recipe_delete_queries(self):
+        self.assertEqual(self.delete_queries(6), self.delete_queries(1))
+        self.assertEqual(set(reconcile().values()), {0})
+
+    def test_user_delete(self):
+        for user in self.users:
+            Subscribe.objects.create(user=user, author=self.author)
+            Subscribe.objects.create(user=self.author, author=user)
+        Recipe.objects.create(
+            author=self.author, name='рецепт', text='текст',
+            cooking_time=10, image='recipes/recipe.png',
+        )
+        with CaptureQueriesContext(connection) as context:
+            self.author.delete()
+        # Уменьшаются только счётчики остальных пользователей: по
+        # одному UPDATE на каждую подписку в обе стороны.
+        self.assertEqual(
+            sum(query['sql'].startswith('UPDATE') for query in context),
+            2 * len(self.users),
+        )
+        self.assertEqual(set(reconcile().values()), {0})
+
+
+class ShoppingListTest(APITestCase):
+    """Таблица списков покупок совпадает с корзинами после изменений."""
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+            )
+            for number in range(3)
+        ]
+        self.tag = Tag.objects.create(name='тег', slug='tag')
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f'продукт{number}', measurement_unit='г',
+            )
+            for number in range(4)
+        ]
+        self.recipes = [self.create_recipe(user) for user in self.users]
+        for user in self.users:
+            for recipe in self.recipes:
+                ShoppingCart.objects.create(user=user, recipe=recipe)
+        self.client.force_authenticate(self.users[0])
+
+    def create_recipe(self, author):
+        recipe = Recipe.objects.create(
+            author=author, name='рецепт', text='текст', cooking_time=10,
+            image='recipes/recipe.png',
+        )
+        recipe.tags.set([self.tag])
+        for number, ingredient in enumerate(self.ingredients[:3]):
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=number + 1,
+            )
+        return recipe
+
+    def assertNoMismatches(self):
+        self.assertEqual(shopping_list.find_mismatches(), [])
+
+    def test_cart_add_and_remove(self):
+        url = f'/api/recipes/{self.recipes[1].id}/shopping_cart/'
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertNoMismatches()
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertNoMismatches()
+
+    def test_recipe_update(self):
+        response = self.client.patch(
+            f'/api/recipes/{self.recipes[0].id}/',
+            {
+                'tags': [self.tag.id],
+                'ingredients': [
+                    {'id': self.ingredients[1].id, 'amount': 10},
+                    {'id': self.ingredients[3].id, 'amount': 4},
+                ],
+            },
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNoMismatches()
+
+    def test_recipe_delete(self):
+        self.assertEqual(
+            self.client.delete(
+                f'/api/recipes/{self.recipes[0].id}/'
+            ).status_code,
+            204,
+        )
+        self.assertNoMismatches()
+        Recipe.objects.filter(pk=self.recipes[1].pk).delete()
+        self.assertNoMismatches()
+
+    def test_user_delete(self):
+        self.users[1].delete()
+        self.assertNoMismatches()
+        self.assertEqual(Recipe.objects.count(), 2)
+
+    def test_ingredient_delete(self):
+        self.ingredients[0].delete()
+        self.assertNoMismatches()
+
+    def test_bulk_delete_queries(self):
+        """Удаление корзин и продуктов меняет списки одним изменением."""
+
+        def shopping_list_queries(queryset):
+            with CaptureQueriesContext(connection) as context:
+                queryset.delete()
+            return [
+                query for query in context
+                if ShoppingListItem._meta.db_table in query['sql']
+            ]
+
+        few = shopping_list_queries(
+            ShoppingCart.objects.filter(recipe=self.recipes[0])
+        )
+        many = shopping_list_queries(ShoppingCart.objects.all())
+        self.assertEqual(len(many), len(few))
+        self.assertNoMismatches()
+        for user in self.users:
+            ShoppingCart.objects.create(user=user, recipe=self.recipes[1])
+        few = shopping_list_queries(RecipeIngredient.objects.filter(
+            recipe=self.recipes[1], ingredient=self.ingredients[0],
+        ))
+        many = shopping_list_queries(
+            RecipeIngredient.objects.filter(recipe=self.recipes[1])
+        )
+        self.assertEqual(len(many), len(few))
+        self.assertNoMismatches()
+
+
+class RecipeUpdateQueriesTest(APITestCase):
+    """Число запросов PATCH рецепта не зависит от числа удалённых продуктов."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+        )
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com',
+        )
+        self.tag = Tag.objects.create(name='тег', slug='tag')
+        self.ingredients = [
+            Ingredient.objects.create(
+                name=f'продукт{number}', measurement_unit='г',
+            )
+            for number in range(12)
+        ]
+        self.client.force_authenticate(self.author)
+
+    def update_queries(self, removed):
+        recipe = Recipe.objects.create(
+            author=self.author, name='рецепт', text='текст',
+            cooking_time=10, image='recipes/recipe.png',
+        )
+        recipe.tags.set([self.tag])
+        for ingredient in self.ingredients:
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=1,
+            )
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(
+                f'/api/recipes/{recipe.id}/',
+                {
+                    'tags': [self.tag.id],
+                    'ingredients': [
+                        {'id': ingredient.id, 'amount': 2}
+                        for ingredient in self.ingredients[removed:]
+                    ],
+                },
+                format='json',
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(shopping_list.find_mismatches(), [])
+        self.assertEqual(set(reconcile().values()), {0})
+        return len(context)
+
+    def test_removed_ingredients_queries(self):
+        # Первый запрос ещё загружает множества избранного и подписок.
+        self.update_queries(1)
+        self.assertEqual(self.update_queries(6), self.update_queries(1))
+
+
+class CatalogETagTest(APITestCase):
+    """ETag справочников зависит только от данных."""
+
+    def setUp(self):
+        Tag.objects.create(name='тег', slug='tag')
+
+    def test_etag_survives_version_loss(self):
+        response = self.client.get('/api/tags/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        # Другой процесс или истёкшая версия: кэш процесса пуст.
+        cache.delete(CATALOG_VERSION_KEY)
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        Tag.objects.create(name='другой тег', slug='other')
+        response = self.client.get('/api/tags/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(len(response.json()), 2)
+
+
+class Base64ImageTest(SimpleTestCase):
+    """Декодирование base64 кусками."""
+
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (40, 30), 'red').save(buffer, format='PNG')
+        self.content = buffer.getvalue()
+        self.encoded = base64.b64encode(self.content).decode()
+
+    def decode(self, encoded):
+        image = decode_base64_image('data:image/png;base64,' + encoded)
+        with image:
+            return image.read()
+
+    def test_line_breaks(self):
+        encoded = '\r\n'.join(
+            self.encoded[position:position + 76]
+            for position in range(0, len(self.encoded), 76)
+        )
+        for chunk_size in (CHUNK_SIZE, 7, 10, 13):
+            with self.subTest(chunk_size=chunk_size):
+                with mock.patch('api.images.CHUNK_SIZE', chunk_size):
+                    self.assertEqual(self.decode(encoded), self.content)
+                    self.assertEqual(
+                        self.decode(' \n'.join(self.encoded)), self.content
+                    )
+
+    def test_invalid(self):
+        for encoded in (self.encoded[:-1], self.encoded[:20] + '*' + 'A' * 3):
+            with self.subTest(encoded=encoded[-8:]):
+                with self.assertRaises(ValidationError):
+                    self.decode(encoded)
@@ -5,7 +5,8 @@ from api.views import (
     FoodgramUserViewSet,
     IngredientViewSet,
     RecipeViewSet,
-    TagViewSet
+    TagViewSet,
+    TokenCacheStatsView
 )
 
 app_name = 'api'
@@ -18,5 +19,6 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('auth/token/cache/', TokenCacheStatsView.as_view()),
     path('auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,5 +1,6 @@
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import HttpResponse, StreamingHttpResponse
 from django.urls import reverse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
@@ -8,15 +9,21 @@ from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
 from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import (
+    IsAdminUser,
     IsAuthenticated,
     IsAuthenticatedOrReadOnly
 )
 from rest_framework.response import Response
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from api.filters import IngredientFilter, RecipeFilter
+from api.authentication import token_cache
+from api.catalog import CatalogCacheMixin, search_ingredients
+from api.filters import IngredientFilter, RecipeFilter, RecipeOrderingFilter
+from api.membership import get_membership
+from api.pagination import CursorPaginatorWithLimit
 from api.permissions import IsAuthorOrReadOnly
-from api.renderers import cart_render
+from api.renderers import CART_RENDERERS, cart_render
 from api.serializers import (
     AvatarSerializer, IngredientSerializer,
     RecipeCreateUpdateSerializer,
@@ -24,20 +31,23 @@ from api.serializers import (
     SubscribersViewSerializer, TagSerializer,
     UserRecipeSerializer
 )
+from recipes.renditions import schedule_deletion
 from recipes.models import (
     Favorite, Ingredient, Recipe, RecipeIngredient,
-    ShoppingCart, Tag, User, Subscribe
+    ShoppingCart, ShoppingListItem, Tag, User, Subscribe
 )
 
+CART_CHUNK_SIZE = 500
 
-class TagViewSet(ReadOnlyModelViewSet):
+
+class TagViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class IngredientViewSet(CatalogCacheMixin, ReadOnlyModelViewSet):
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -45,9 +55,22 @@ class IngredientViewSet(ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        if 'name' not in request.query_params:
+            return super().list(request, *args, **kwargs)
+        return self.catalog_response(self.search, request)
+
+    def search(self, request):
+        return HttpResponse(
+            search_ingredients(request.query_params['name']),
+            content_type='application/json'
+        )
+
 
 class FoodgramUserViewSet(UserViewSet):
 
+    cursor_ordering = ('username',)
+
     def get_permissions(self):
         if self.action in ['me']:
             return [IsAuthenticated(), ]
@@ -65,15 +88,48 @@ class FoodgramUserViewSet(UserViewSet):
             if serializer.is_valid(raise_exception=True):
                 serializer.save()
                 return Response(serializer.data, status=status.HTTP_200_OK)
-        user.avatar.delete()
+        with transaction.atomic():
+            schedule_deletion(user.avatar)
+            user.avatar = None
+            user.save(update_fields=('avatar',))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def get_recipes_limit(self):
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit is None:
+            return None
+        try:
+            recipes_limit = int(recipes_limit)
+        except ValueError:
+            recipes_limit = -1
+        if recipes_limit < 0:
+            raise ValidationError(
+                {'recipes_limit': 'Ожидается целое неотрицательное число.'}
+            )
+        return recipes_limit
+
+    def get_subscribers_queryset(self, authors):
+        """Авторы с данными для SubscribersViewSerializer.
+
+        Первые recipes_limit рецептов всех авторов страницы выбираются
+        одним запросом с оконной функцией.
+        """
+        recipes = Recipe.objects.all()
+        recipes_limit = self.get_recipes_limit()
+        if recipes_limit is not None:
+            recipes = recipes[:recipes_limit]
+        return authors.prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='short_recipes')
+        )
+
     @action(
         detail=False,
         methods=['GET'],
     )
     def subscriptions(self, request):
-        subscriptions = User.objects.filter(authors__user=self.request.user)
+        subscriptions = self.get_subscribers_queryset(
+            User.objects.filter(authors__user=self.request.user)
+        )
         pages = self.paginate_queryset(subscriptions)
         return self.get_paginated_response(
             SubscribersViewSerializer(
@@ -90,6 +146,7 @@ class FoodgramUserViewSet(UserViewSet):
         user = request.user
         if request.method == 'DELETE':
             get_object_or_404(Subscribe, user=user, author=author).delete()
+            get_membership(request).discard(Subscribe, author.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         if user == author:
             raise ValidationError(
@@ -103,6 +160,10 @@ class FoodgramUserViewSet(UserViewSet):
             raise ValidationError(
                 'Вы уже подписаны на пользователя {author}.'
             )
+        get_membership(request).add(Subscribe, author.id)
+        author = self.get_subscribers_queryset(
+            User.objects.filter(id=author.id)
+        ).get()
         return Response(
             SubscribersViewSerializer(author, context={'request': request})
             .data,
@@ -115,11 +176,35 @@ class RecipeViewSet(ModelViewSet):
     queryset = Recipe.objects.all()
     http_method_names = ['get', 'post', 'patch', 'delete']
     permission_classes = (IsAuthorOrReadOnly, IsAuthenticatedOrReadOnly)
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
+    ordering_fields = ('pub_date', 'favorites_count', 'cart_count')
+    ordering = ('-pub_date', '-id')
+
+    def get_queryset(self):
+        if self.action == 'feed':
+            return self.get_view_queryset(super().get_queryset().filter(
+                author__in=Subscribe.objects.filter(
+                    user=self.request.user
+                ).values('author')
+            ))
+        if self.action not in ('list', 'retrieve'):
+            return super().get_queryset()
+        return self.get_view_queryset(super().get_queryset())
+
+    def get_view_queryset(self, recipes):
+        """Рецепты со всеми данными для RecipeViewSerializer."""
+        return recipes.prefetch_related(
+            'tags',
+            'author',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'feed'):
             return RecipeViewSerializer
         return RecipeCreateUpdateSerializer
 
@@ -131,17 +216,33 @@ class RecipeViewSet(ModelViewSet):
         recipe = get_object_or_404(Recipe, pk=pk)
         if request.method == 'DELETE':
             get_object_or_404(model, user=user, recipe=recipe).delete()
+            get_membership(request).discard(model, recipe.id)
             return Response(status=status.HTTP_204_NO_CONTENT)
         _, created = model.objects.get_or_create(user=user, recipe=recipe)
         if not created:
             raise ValidationError(
                 {'detail': f'Рецепт {recipe} уже добавлен в {message}.'}
             )
+        get_membership(request).add(model, recipe.id)
         return Response(
             UserRecipeSerializer(recipe).data,
             status=status.HTTP_201_CREATED
         )
 
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,),
+        filter_backends=(),
+        pagination_class=CursorPaginatorWithLimit,
+    )
+    def feed(self, request):
+        """Новые рецепты авторов из подписок пользователя."""
+        page = self.paginate_queryset(self.get_queryset())
+        return self.get_paginated_response(
+            self.get_serializer(page, many=True).data
+        )
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -168,25 +269,37 @@ class RecipeViewSet(ModelViewSet):
         detail=False,
         methods=['get'],
         permission_classes=(IsAuthenticated,),
+        renderer_classes=CART_RENDERERS,
     )
     def download_shopping_cart(self, request):
         user = request.user
         ingredients = (
-            RecipeIngredient.objects.filter(
-                recipe__shopping_carts__user=request.user
-            )
-            .values(
+            ShoppingListItem.objects.filter(user=user)
+            .values_list(
                 'ingredient__name',
                 'ingredient__measurement_unit',
+                'total_amount',
             )
-            .annotate(amount=Sum('amount'))
             .order_by('ingredient__name')
+            .iterator(chunk_size=CART_CHUNK_SIZE)
+        )
+        recipes = (
+            Recipe.objects.filter(shopping_carts__user=user)
+            .order_by('name')
+            .values_list('name', 'author__username')
+            .iterator(chunk_size=CART_CHUNK_SIZE)
         )
-        recipes = (user.shopping_carts.all())
-        return FileResponse(
-            cart_render(ingredients, recipes),
-            as_attachment=True, filename="list.txt"
+        format = request.accepted_renderer.format
+        response = StreamingHttpResponse(
+            cart_render(ingredients, recipes, format),
+            content_type=(
+                f'{request.accepted_renderer.media_type}; charset=utf-8'
+            ),
         )
+        response['Content-Disposition'] = (
+            f'attachment; filename="list.{format}"'
+        )
+        return response
 
     @action(
         detail=True,
@@ -203,3 +316,12 @@ class RecipeViewSet(ModelViewSet):
             )
         )
         return Response({'short-link': short_link}, status=status.HTTP_200_OK)
+
+
+class TokenCacheStatsView(APIView):
+    """Статистика кэша токенов текущего процесса."""
+
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(token_cache.stats())
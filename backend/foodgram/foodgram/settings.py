@@ -33,10 +33,14 @@ INSTALLED_APPS = [
     'djoser',
     'recipes.apps.RecipesConfig',
     'api.apps.ApiConfig',
+    'jobs.apps.JobsConfig',
 
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'api.nplusone.NPlusOneMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -109,7 +113,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
@@ -118,6 +122,90 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 6,
 }
 
+# Кэш Django. По умолчанию он в памяти каждого процесса; общий для всех
+# процессов кэш задаётся переменными окружения, например
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache и
+# CACHE_LOCATION=redis://redis:6379 или
+# CACHE_BACKEND=django.core.cache.backends.memcached.PyMemcacheCache и
+# CACHE_LOCATION=memcached:11211.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+)
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# Версии каталога и множеств пользователя в кэше процесса не видны
+# другим процессам, поэтому живут ограниченное время (см. ниже).
+CACHE_SHARED = CACHE_BACKEND not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Справочники тегов и продуктов: время жизни ответа у клиента (секунды)
+# и число готовых ответов в локальном кэше процесса. Без общего кэша
+# версия каталога живёт столько же, и другие процессы видят изменения
+# справочников с той же задержкой, что и клиенты.
+CATALOG_CACHE_MAX_AGE = int(os.getenv('CATALOG_CACHE_MAX_AGE', 60))
+CATALOG_BODY_CACHE_SIZE = int(os.getenv('CATALOG_BODY_CACHE_SIZE', 1024))
+
+# Максимум продуктов в ответе поиска по началу названия.
+INGREDIENTS_SEARCH_LIMIT = int(os.getenv('INGREDIENTS_SEARCH_LIMIT', 50))
+
+# Кэш токенов аутентификации. TOKEN_CACHE_ALIAS - имя общего для всех
+# процессов кэша из CACHES: записи живут TOKEN_CACHE_TTL секунд, выход и
+# деактивация действуют сразу. Без него записи хранятся в памяти каждого
+# процесса (не больше TOKEN_CACHE_SIZE) и удаляются только в процессе,
+# обработавшем выход, поэтому живут всего TOKEN_CACHE_LOCAL_TTL секунд -
+# на столько другие процессы могут опоздать с отзывом токена.
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 60))
+TOKEN_CACHE_LOCAL_TTL = int(os.getenv('TOKEN_CACHE_LOCAL_TTL', 5))
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+TOKEN_CACHE_ALIAS = os.getenv('TOKEN_CACHE_ALIAS', '')
+
+# Время жизни (секунды) множеств избранного, корзины и подписок
+# пользователя в кэше Django; 0 - загружать их заново в каждом запросе.
+# Без общего кэша версия множества живёт MEMBERSHIP_CACHE_LOCAL_TTL
+# секунд - на столько другие процессы могут опоздать с изменением.
+MEMBERSHIP_CACHE_TIMEOUT = int(os.getenv('MEMBERSHIP_CACHE_TIMEOUT', 300))
+MEMBERSHIP_CACHE_LOCAL_TTL = int(os.getenv('MEMBERSHIP_CACHE_LOCAL_TTL', 5))
+
+# Профилирование запросов: заголовок Server-Timing и строка лога
+# api.profiling с этапами каждого запроса. Дампы cProfile пишутся в
+# PROFILING_DIR для доли PROFILING_SAMPLE_RATE процентов запросов и для
+# запросов дольше PROFILING_SLOW_MS миллисекунд (0 - без порога).
+PROFILING = bool(os.getenv('PROFILING', False))
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+PROFILING_SLOW_MS = float(os.getenv('PROFILING_SLOW_MS', 0))
+PROFILING_DIR = os.getenv('PROFILING_DIR', BASE_DIR / 'profiles')
+
+# Метрики Prometheus на /metrics: доступны только адресам и сетям из
+# METRICS_ALLOWED_IPS. Для нескольких процессов gunicorn нужен каталог
+# в переменной окружения PROMETHEUS_MULTIPROC_DIR: при METRICS его
+# задаёт gunicorn.conf.py.
+METRICS = bool(os.getenv('METRICS', False))
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1,::1').split(',')
+
+# Поиск N+1 для разработки и тестов: запрос, шаблон SQL которого
+# повторился больше NPLUSONE_THRESHOLD раз, в режиме 'warn' получает
+# заголовок X-NPlusOne, в режиме 'raise' завершается ошибкой.
+NPLUSONE = os.getenv('NPLUSONE', '')
+NPLUSONE_THRESHOLD = int(os.getenv('NPLUSONE_THRESHOLD', 5))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'api.profiling': {'handlers': ['console'], 'level': 'INFO'},
+        'api.nplusone': {'handlers': ['console'], 'level': 'WARNING'},
+    },
+}
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
@@ -153,6 +241,35 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Изображения в base64: максимальный размер в байтах, максимальное число
+# пикселей и размер, до которого файл держится в памяти при декодировании.
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', 40_000_000))
+IMAGE_SPOOL_SIZE = int(os.getenv('IMAGE_SPOOL_SIZE', 1024 * 1024))
+
+# Копии изображений рецептов и аватаров в WebP: имя размера для
+# ?image_size= и длина большей стороны (None - исходный размер).
+IMAGE_RENDITIONS = {
+    'small': 240,
+    'medium': 600,
+    'full': None,
+}
+IMAGE_RENDITION_QUALITY = int(os.getenv('IMAGE_RENDITION_QUALITY', 80))
+
+# Фоновые задачи (manage.py run_worker). В режиме JOBS_EAGER задачи
+# выполняются сразу при постановке в очередь - для тестов и отладки.
+JOBS_EAGER = bool(os.getenv('JOBS_EAGER', False))
+JOBS_WORKERS = int(os.getenv('JOBS_WORKERS', 2))
+JOBS_MAX_ATTEMPTS = int(os.getenv('JOBS_MAX_ATTEMPTS', 3))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 30))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_STALE_TIMEOUT = int(os.getenv('JOBS_STALE_TIMEOUT', 3600))
+# Выполненные и завершившиеся ошибкой задачи (вместе с ключами
+# идемпотентности) удаляются через JOBS_RETENTION_DAYS дней, 0 - хранить
+# всегда. Обработчик проверяет это раз в JOBS_PURGE_INTERVAL секунд.
+JOBS_RETENTION_DAYS = int(os.getenv('JOBS_RETENTION_DAYS', 7))
+JOBS_PURGE_INTERVAL = int(os.getenv('JOBS_PURGE_INTERVAL', 3600))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
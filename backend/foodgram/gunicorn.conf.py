@@ -0,0 +1,23 @@
+import os
+import shutil
+
+# Метрики собираются со всех процессов только через общий каталог.
+# Переменная задаётся до первого импорта prometheus_client, который
+# выбирает режим при импорте, и только для gunicorn: run_worker и
+# команды manage.py работают без многопроцессного режима.
+if os.getenv('METRICS'):
+    os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+
+
+def on_starting(server):
+    """Удаляет значения метрик, оставшиеся от прошлого запуска."""
+    directory = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,121 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from jobs.queue import (claim_jobs, execute_job, purge_finished,
+                        requeue_interrupted, requeue_stale)
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в пуле процессов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.JOBS_WORKERS,
+            help='Число процессов-обработчиков.',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи и завершиться.',
+        )
+
+    @staticmethod
+    def create_pool(workers):
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=get_context('spawn'),
+            initializer=django.setup,
+        )
+
+    @staticmethod
+    def purge():
+        if not settings.JOBS_RETENTION_DAYS:
+            return
+        purged = purge_finished(settings.JOBS_RETENTION_DAYS)
+        if purged:
+            print(f'Удалено завершённых задач: {purged}.')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        requeued = requeue_stale(settings.JOBS_STALE_TIMEOUT)
+        if requeued:
+            print(f'Возвращено в очередь зависших задач: {requeued}.')
+        self.purge()
+        purged_at = time.monotonic()
+        print(f'Обработчик задач запущен, процессов: {workers}.')
+        # Выполняемые задачи: future -> id задачи.
+        running = {}
+        pool = self.create_pool(workers)
+        try:
+            while True:
+                if (
+                    time.monotonic() - purged_at
+                    >= settings.JOBS_PURGE_INTERVAL
+                ):
+                    self.purge()
+                    purged_at = time.monotonic()
+                free = workers - len(running)
+                claimed = claim_jobs(free) if free > 0 else []
+                broken = None
+                for number, pk in enumerate(claimed):
+                    try:
+                        running[pool.submit(execute_job, pk)] = pk
+                    except BrokenProcessPool as error:
+                        broken = error, claimed[number:]
+                        break
+                if broken is None and running:
+                    done, _ = wait(
+                        running,
+                        timeout=settings.JOBS_POLL_INTERVAL,
+                        return_when=FIRST_COMPLETED,
+                    )
+                    for future in done:
+                        error = future.exception()
+                        if isinstance(error, BrokenProcessPool):
+                            # Задача остаётся в running до перезапуска.
+                            broken = error, []
+                            continue
+                        if error is not None:
+                            print(f'Сбой обработчика: {error}')
+                        del running[future]
+                if broken is not None:
+                    error, unsubmitted = broken
+                    pool = self.restart(
+                        pool, workers, [*running.values(), *unsubmitted],
+                        error,
+                    )
+                    running = {}
+                    continue
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(settings.JOBS_POLL_INTERVAL)
+        except KeyboardInterrupt:
+            print('Остановка: ожидание выполняемых задач.')
+            wait(running)
+        finally:
+            pool.shutdown()
+
+    def restart(self, pool, workers, pks, error):
+        """Заменяет сломанный пул и возвращает его задачи в очередь.
+
+        Если процесс пула падает (например, из-за нехватки памяти), пул
+        больше не принимает задачи, а выполнявшиеся в нём прерываются.
+        """
+        pool.shutdown(wait=False, cancel_futures=True)
+        queued, failed = requeue_interrupted(
+            pks, f'Процесс обработчика завершился аварийно: {error}'
+        )
+        print(
+            f'Пул процессов пересоздан после сбоя. Возвращено в очередь '
+            f'задач: {queued}, исчерпали попытки: {failed}. {error}'
+        )
+        return self.create_pool(workers)
@@ -0,0 +1,160 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from jobs.models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу с именем name.
+
+    Функция получает аргументы из payload задачи как именованные.
+    Модули tasks.py приложений импортируются автоматически.
+    """
+    def register(function):
+        TASKS[name] = function
+        return function
+    return register
+
+
+def enqueue(name, payload=None, priority=0, idempotency_key=None,
+            max_attempts=None, delay=None):
+    """Ставит задачу в очередь и возвращает её.
+
+    Задача с уже известным idempotency_key повторно не создаётся.
+    Запись создаётся в текущей транзакции, поэтому обработчик увидит
+    задачу только после её фиксации. В режиме JOBS_EAGER задача
+    выполняется сразу, а исключения пробрасываются вызывающему коду.
+    """
+    if name not in TASKS:
+        raise LookupError(f'Неизвестная задача {name}.')
+    if idempotency_key is not None:
+        job = Job.objects.filter(idempotency_key=idempotency_key).first()
+        if job is not None:
+            return job
+    job = Job(
+        name=name,
+        payload=payload or {},
+        priority=priority,
+        idempotency_key=idempotency_key,
+        max_attempts=max_attempts or settings.JOBS_MAX_ATTEMPTS,
+        run_after=timezone.now() + (delay or timedelta()),
+    )
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return Job.objects.get(idempotency_key=idempotency_key)
+    if settings.JOBS_EAGER:
+        Job.objects.filter(pk=job.pk).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1
+        )
+        run_job(job.pk, propagate=True)
+        job.refresh_from_db()
+    return job
+
+
+def claim_jobs(limit):
+    """Забирает до limit готовых задач в работу; возвращает их id.
+
+    Захват - условный UPDATE по статусу, поэтому несколько обработчиков
+    не получат одну задачу без блокировок, специфичных для СУБД.
+    """
+    candidates = Job.objects.filter(
+        status=Job.QUEUED, run_after__lte=timezone.now()
+    ).values_list('pk', flat=True)[:limit]
+    return [
+        pk for pk in candidates
+        if Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING,
+            attempts=F('attempts') + 1,
+            updated_at=timezone.now(),
+        )
+    ]
+
+
+def requeue_stale(timeout):
+    """Возвращает в очередь задачи, зависшие после падения обработчика."""
+    return Job.objects.filter(
+        status=Job.RUNNING,
+        updated_at__lt=timezone.now() - timedelta(seconds=timeout),
+    ).update(status=Job.QUEUED, updated_at=timezone.now())
+
+
+def requeue_interrupted(pks, error):
+    """Возвращает в очередь задачи, прерванные падением процесса пула.
+
+    Падение считается попыткой: задача, исчерпавшая попытки, получает
+    статус ошибки, чтобы не ронять пул снова и снова. Уже завершённые
+    задачи не затрагиваются. Возвращает (в очереди, с ошибкой).
+    """
+    jobs = Job.objects.filter(pk__in=pks, status=Job.RUNNING)
+    failed = jobs.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, last_error=error, updated_at=timezone.now()
+    )
+    queued = jobs.update(
+        status=Job.QUEUED, last_error=error, updated_at=timezone.now()
+    )
+    return queued, failed
+
+
+def purge_finished(days):
+    """Удаляет выполненные и завершившиеся ошибкой задачи старше days дней.
+
+    Вместе с задачами удаляются их ключи идемпотентности: задачу с тем
+    же ключом после этого можно поставить снова. Возвращает число
+    удалённых задач.
+    """
+    deleted, _ = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED),
+        updated_at__lt=timezone.now() - timedelta(days=days),
+    ).delete()
+    return deleted
+
+
+def run_job(pk, propagate=False):
+    """Выполняет захваченную задачу и записывает результат.
+
+    При ошибке задача возвращается в очередь с экспоненциальной
+    задержкой, пока не исчерпаны попытки.
+    """
+    job = Job.objects.get(pk=pk)
+    try:
+        TASKS[job.name](**job.payload)
+    except Exception as error:
+        logger.exception('Задача %s #%s завершилась ошибкой', job.name, pk)
+        job.last_error = traceback.format_exc()
+        if job.attempts >= job.max_attempts:
+            job.status = Job.FAILED
+        else:
+            job.status = Job.QUEUED
+            job.run_after = timezone.now() + timedelta(
+                seconds=settings.JOBS_RETRY_DELAY * 2 ** (job.attempts - 1)
+            )
+        job.save(update_fields=(
+            'status', 'run_after', 'last_error', 'updated_at'
+        ))
+        if propagate:
+            raise error
+        return job.status
+    job.status = Job.DONE
+    job.save(update_fields=('status', 'updated_at'))
+    return job.status
+
+
+def execute_job(pk):
+    """Точка входа процесса-обработчика для одной задачи."""
+    close_old_connections()
+    try:
+        return run_job(pk)
+    finally:
+        close_old_connections()
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from jobs.models import Job
+from jobs.queue import purge_finished, requeue_interrupted
+
+
+class QueueMaintenanceTest(TestCase):
+
+    def create_job(self, status, attempts=1, age=0, key=None):
+        job = Job.objects.create(
+            name='recipes.delete_files', payload={'names': []},
+            status=status, attempts=attempts, max_attempts=2,
+            idempotency_key=key,
+        )
+        Job.objects.filter(pk=job.pk).update(
+            updated_at=timezone.now() - timedelta(days=age)
+        )
+        return job
+
+    def test_requeue_interrupted(self):
+        retry = self.create_job(Job.RUNNING)
+        exhausted = self.create_job(Job.RUNNING, attempts=2)
+        done = self.create_job(Job.DONE)
+        self.assertEqual(
+            requeue_interrupted([retry.pk, exhausted.pk, done.pk], 'сбой'),
+            (1, 1),
+        )
+        statuses = dict(Job.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[retry.pk], Job.QUEUED)
+        self.assertEqual(statuses[exhausted.pk], Job.FAILED)
+        self.assertEqual(statuses[done.pk], Job.DONE)
+
+    def test_purge_finished(self):
+        old_done = self.create_job(Job.DONE, age=10, key='done')
+        old_failed = self.create_job(Job.FAILED, age=10)
+        old_queued = self.create_job(Job.QUEUED, age=10)
+        recent_done = self.create_job(Job.DONE, age=1)
+        self.assertEqual(purge_finished(7), 2)
+        self.assertEqual(
+            set(Job.objects.values_list('pk', flat=True)),
+            {old_queued.pk, recent_done.pk},
+        )
+        self.assertFalse(
+            Job.objects.filter(pk__in=(old_done.pk, old_failed.pk)).exists()
+        )
@@ -1,6 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
+from django.db.models import Prefetch
 from django.utils.safestring import mark_safe
 
 from .models import (
@@ -17,6 +18,7 @@ admin.site.unregister(Group)
 @admin.register(Favorite, ShoppingCart)
 class FavoriteCartAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe')
+    list_select_related = ('user', 'recipe')
     search_fields = ('user', 'recipe')
 
 
@@ -24,9 +26,9 @@ class RecipesCountMixin():
 
     list_display = ('recipes_count',)
 
-    @admin.display(description='Рецептов')
+    @admin.display(description='Рецептов', ordering='recipes_count')
     def recipes_count(self, ingredient):
-        return ingredient.recipes.count()
+        return ingredient.recipes_count
 
 
 @admin.register(Tag)
@@ -60,15 +62,27 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display_links = ('name',)
     list_filter = ('author',)
     inlines = (IngredientInline,)
+    list_select_related = ('author',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
 
-    @admin.display(description='В избранном')
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorites_count(self, recipe):
-        return recipe.favorites.count()
+        return recipe.favorites_count
 
     @admin.display(description='Изображение')
     @mark_safe
     def get_image(self, recipe):
-        return mark_safe(f'<img src="{recipe.image.url}" width=50 />')
+        if recipe.image:
+            return f'<img src="{recipe.image.url}" width=50 />'
+        return ''
 
     @admin.display(description='Тэги')
     @mark_safe
@@ -91,6 +105,7 @@ class RecipeAdmin(admin.ModelAdmin):
 @admin.register(Subscribe)
 class SubscribeAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'author')
+    list_select_related = ('user', 'author')
     search_fields = ('user', 'author')
 
 
@@ -172,10 +187,10 @@ class UserAdmin(RecipesCountMixin, UserAdmin):
             return f'<img src="{user.avatar.url}" width=50 />'
         return ''
 
-    @admin.display(description='Подписки')
+    @admin.display(description='Подписки', ordering='subscriptions_count')
     def get_subscriptions_count(self, user):
-        return user.subscribers.count()
+        return user.subscriptions_count
 
-    @admin.display(description='Подписчики')
+    @admin.display(description='Подписчики', ordering='subscribers_count')
     def get_subscribers_count(self, user):
-        return user.authors.count()
+        return user.subscribers_count
@@ -0,0 +1,171 @@
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+
+from recipes.deletion import deleted_ids, handled
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Subscribe, Tag, User)
+
+
+def change_counter(model, field, delta, **filters):
+    """Атомарно меняет счётчик на delta выражением F() в одном UPDATE."""
+    if delta < 0:
+        filters[f'{field}__gte'] = -delta
+    model.objects.filter(**filters).update(**{field: F(field) + delta})
+
+
+def count_subquery(model, field):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(count=Count('pk'))
+            .values('count')
+        ),
+        0,
+    )
+
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscribe, 'author'),
+    (User, 'subscriptions_count', Subscribe, 'user'),
+    (Tag, 'recipes_count', Recipe.tags.through, 'tag'),
+    (Ingredient, 'recipes_count', RecipeIngredient, 'ingredient'),
+)
+
+
+def recount_tags(**filters):
+    """Точный пересчёт тегов после удаления связей с рецептами.
+
+    Промежуточная модель Recipe.tags создана автоматически, и для неё
+    Django не отправляет сигналы удаления.
+    """
+    Tag.objects.filter(**filters).update(
+        recipes_count=count_subquery(Recipe.tags.through, 'tag')
+    )
+
+
+def reconcile():
+    """Исправляет расхождения счётчиков с данными.
+
+    Возвращает {(модель, поле): число исправленных строк}.
+    """
+    fixed = {}
+    for model, field, related_model, related_field in COUNTERS:
+        real = count_subquery(related_model, related_field)
+        ids = list(
+            model.objects.annotate(real=real)
+            .exclude(**{field: F('real')})
+            .values_list('pk', flat=True)
+        )
+        if ids:
+            model.objects.filter(pk__in=ids).update(**{field: real})
+        fixed[model._meta.model_name, field] = len(ids)
+    return fixed
+
+
+def deleting(origin, model, pk):
+    """Объект удаляется тем же delete(): его счётчик менять незачем."""
+    return pk in deleted_ids(origin, model, deleted=True)
+
+
+def changed_recipe_ingredients(ingredient_ids, delta):
+    """Для путей с bulk_create, где сигналы post_save не отправляются."""
+    change_counter(Ingredient, 'recipes_count', delta, pk__in=ingredient_ids)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, 'favorites_count', 1, pk=instance.recipe_id)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(instance, origin=None, **kwargs):
+    if not deleting(origin, Recipe, instance.recipe_id):
+        change_counter(Recipe, 'favorites_count', -1, pk=instance.recipe_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_created(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, 'cart_count', 1, pk=instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_deleted(instance, origin=None, **kwargs):
+    if not deleting(origin, Recipe, instance.recipe_id):
+        change_counter(Recipe, 'cart_count', -1, pk=instance.recipe_id)
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribe_created(instance, created, **kwargs):
+    if created:
+        change_counter(User, 'subscribers_count', 1, pk=instance.author_id)
+        change_counter(User, 'subscriptions_count', 1, pk=instance.user_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscribe_deleted(instance, origin=None, **kwargs):
+    if not deleting(origin, User, instance.author_id):
+        change_counter(User, 'subscribers_count', -1, pk=instance.author_id)
+    if not deleting(origin, User, instance.user_id):
+        change_counter(User, 'subscriptions_count', -1, pk=instance.user_id)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    if created:
+        change_counter(User, 'recipes_count', 1, pk=instance.author_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, origin=None, **kwargs):
+    if not deleting(origin, User, instance.author_id):
+        change_counter(User, 'recipes_count', -1, pk=instance.author_id)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_created(instance, created, **kwargs):
+    if created:
+        changed_recipe_ingredients([instance.ingredient_id], 1)
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(instance, origin=None, **kwargs):
+    if not (
+        handled(origin)
+        or deleting(origin, Ingredient, instance.ingredient_id)
+    ):
+        changed_recipe_ingredients([instance.ingredient_id], -1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting(instance, **kwargs):
+    instance._tag_ids = list(instance.tags.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_tags_deleted(instance, **kwargs):
+    recount_tags(pk__in=instance._tag_ids)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            recount_tags(pk=instance.pk)
+    elif action == 'post_add' and pk_set:
+        change_counter(Tag, 'recipes_count', 1, pk__in=pk_set)
+    elif action == 'post_remove' and pk_set:
+        recount_tags(pk__in=pk_set)
+    elif action == 'pre_clear':
+        instance._tag_ids = list(instance.tags.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        recount_tags(pk__in=instance._tag_ids)
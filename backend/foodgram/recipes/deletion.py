@@ -0,0 +1,58 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from recipes.models import Ingredient, Recipe, User
+
+
+class DeletionState(dict):
+    """Данные одного delete() по именам; deleted - были post_delete."""
+
+    deleted = False
+
+
+def origin_state(origin, name, factory=set, deleted=False):
+    """Данные, общие для одного delete(), в атрибуте origin.
+
+    Все pre_delete отправляются до первого post_delete, поэтому к
+    обработке каскадно удаляемых строк уже известно всё, что удаляется
+    вместе с ними. Обработчики post_delete передают deleted=True, и
+    следующий delete() с тем же origin (повторное удаление того же
+    запроса) начинает с чистых данных. Без origin (сигнал отправлен
+    вручную) данные не сохраняются между вызовами.
+    """
+    if origin is None:
+        return factory()
+    state = getattr(origin, '_deletion_state', None)
+    if state is None or (state.deleted and not deleted):
+        state = DeletionState()
+        origin._deletion_state = state
+    state.deleted = state.deleted or deleted
+    if name not in state:
+        state[name] = factory()
+    return state[name]
+
+
+def deleted_ids(origin, model, deleted=False):
+    """Id объектов model, удаляемых вместе с origin."""
+    return origin_state(origin, model._meta.model_name, deleted=deleted)
+
+
+def delete_handled(queryset):
+    """Удаляет строки, изменения от которых вызывающий код учёл сам.
+
+    Обработчики удаления продуктов рецепта пропускают такой delete():
+    счётчики и списки покупок меняются одним вызовом на всю пачку.
+    """
+    queryset._deletion_handled = True
+    return queryset.delete()
+
+
+def handled(origin):
+    return getattr(origin, '_deletion_handled', False)
+
+
+@receiver(pre_delete, sender=Ingredient)
+@receiver(pre_delete, sender=Recipe)
+@receiver(pre_delete, sender=User)
+def parent_deleting(sender, instance, origin=None, **kwargs):
+    deleted_ids(origin, sender).add(instance.pk)
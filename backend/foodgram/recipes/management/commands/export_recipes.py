@@ -0,0 +1,47 @@
+import json
+import sys
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import BATCH_SIZE, export_batches
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает рецепты в JSONL: одна строка - один рецепт с тегами, '
+        'продуктами, автором и путём к изображению.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл для выгрузки, "-" - стандартный вывод.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько рецептов читать из базы за раз.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file = (
+            sys.stdout if path == '-'
+            else open(path, 'w', encoding='utf-8')
+        )
+        started = time.monotonic()
+        amount = 0
+        try:
+            for batch in export_batches(options['batch_size']):
+                for recipe in batch:
+                    file.write(json.dumps(recipe, ensure_ascii=False))
+                    file.write('\n')
+                amount += len(batch)
+                print(
+                    f'Выгружено {amount} рецептов '
+                    f'({amount / (time.monotonic() - started):.0f}/с).',
+                    file=sys.stderr,
+                )
+        finally:
+            if file is not sys.stdout:
+                file.close()
+        print(f'Всего выгружено {amount} рецептов.', file=sys.stderr)
@@ -0,0 +1,91 @@
+import json
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.counters import reconcile
+from recipes.transfer import (BATCH_SIZE, RecipeImporter, read_checkpoint,
+                              write_checkpoint)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает рецепты из JSONL, созданного export_recipes. '
+        'После каждой пачки записывает отметку, с которой можно '
+        'продолжить загрузку (--resume).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL с рецептами.')
+        parser.add_argument(
+            '--batch-size', type=int, default=BATCH_SIZE,
+            help='Сколько рецептов записывать за одну транзакцию.',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл отметки, по умолчанию <path>.checkpoint.',
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить с сохранённой отметки.',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        offset = line = imported = skipped = 0
+        if options['resume']:
+            offset, line, imported, skipped = read_checkpoint(checkpoint)
+            print(f'Продолжение со строки {line + 1}.')
+        elif os.path.exists(checkpoint):
+            raise CommandError(
+                f'Найдена отметка {checkpoint}: загрузка прервана. '
+                'Запустите с --resume или удалите файл.'
+            )
+        importer = RecipeImporter()
+        started = time.monotonic()
+        done = 0
+        try:
+            file = open(path, 'rb')
+        except OSError as error:
+            raise CommandError(f'Ошибка при работе с файлом {path}: {error}')
+        with file:
+            file.seek(offset)
+            while True:
+                batch, numbers = [], []
+                while len(batch) < options['batch_size']:
+                    raw = file.readline()
+                    if not raw:
+                        break
+                    line += 1
+                    if not raw.strip():
+                        continue
+                    numbers.append(line)
+                    try:
+                        batch.append(json.loads(raw))
+                    except ValueError as error:
+                        batch.append(None)
+                        print(f'Строка {line}: неверный JSON: {error}.')
+                if not batch:
+                    break
+                errors = importer.import_batch(batch)
+                for number, error in errors:
+                    if batch[number] is not None:
+                        print(f'Строка {numbers[number]}: {error}')
+                imported += len(batch) - len(errors)
+                skipped += len(errors)
+                done += len(batch) - len(errors)
+                write_checkpoint(
+                    checkpoint, file.tell(), line, imported, skipped
+                )
+                print(
+                    f'Загружено {imported} рецептов, пропущено {skipped} '
+                    f'({done / (time.monotonic() - started):.0f}/с).'
+                )
+        for (model_name, field), amount in reconcile().items():
+            if amount:
+                print(f'{model_name}.{field}: исправлено {amount}')
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        print(f'Всего загружено {imported} рецептов, пропущено {skipped}.')
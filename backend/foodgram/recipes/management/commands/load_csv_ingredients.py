@@ -3,23 +3,52 @@ import logging
 
 from django.core.management.base import BaseCommand
 
+from api.catalog import bump_catalog_version
 from recipes.models import Ingredient
+from recipes.sync import CatalogSync
 
 logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Добавить новые и обновить изменённые продукты.',
+        )
+
     def handle(self, *args, **options):
         filename = 'ingredients.csv'
         try:
             with open(f'data/{filename}', 'r', encoding='utf-8') as file:
                 reader = csv.reader(file, delimiter=',')
+                if options['sync']:
+                    result = CatalogSync(
+                        Ingredient, ('name', 'measurement_unit'), 'name'
+                    ).sync(
+                        {'name': name, 'measurement_unit': unit}
+                        for name, unit in reader
+                    )
+                    if result.changed:
+                        bump_catalog_version()
+                    print(
+                        f'Продукты из файла {filename}: '
+                        f'добавлено {result.inserted}, '
+                        f'обновлено {result.updated}, '
+                        f'без изменений {result.unchanged}.'
+                    )
+                    return
                 ingredients = [Ingredient(
                     name=name, measurement_unit=unit
                 ) for name, unit in reader]
-                amount = len(Ingredient.objects.bulk_create(
+                before = Ingredient.objects.count()
+                Ingredient.objects.bulk_create(
                     ingredients, ignore_conflicts=True
-                ))
+                )
+                amount = Ingredient.objects.count() - before
+                if amount:
+                    bump_catalog_version()
                 print(f'Добавлено {amount} продукта из фала {filename}.')
         except FileNotFoundError:
             print(f'Запрашиваемый файл {filename} не найден')
@@ -6,3 +6,5 @@ class Command(LoadJson):
 
     filename = 'ingredients.json'
     model = Ingredient
+    key_fields = ('name', 'measurement_unit')
+    match_field = 'name'
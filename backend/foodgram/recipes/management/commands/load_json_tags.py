@@ -6,3 +6,5 @@ class Command(LoadJson):
 
     filename = 'tags.json'
     model = Tag
+    key_fields = ('slug',)
+    match_field = 'name'
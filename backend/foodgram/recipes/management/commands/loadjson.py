@@ -2,19 +2,34 @@ import json
 
 from django.core.management.base import BaseCommand
 
+from api.catalog import bump_catalog_version
+from recipes.sync import CatalogSync, iter_json_array
+
 
 class LoadJson(BaseCommand):
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Добавить новые и обновить изменённые записи.',
+        )
+
     def handle(self, *args, **options):
         try:
             with open(f'data/{self.filename}', 'r', encoding='utf-8') as file:
+                if options['sync']:
+                    self.sync(file)
+                    return
                 reader = json.load(file)
                 items = [
                     self.model(**item) for item in reader
                 ]
-                amount = len(self.model.objects.bulk_create(
-                    items, ignore_conflicts=True
-                ))
+                before = self.model.objects.count()
+                self.model.objects.bulk_create(items, ignore_conflicts=True)
+                amount = self.model.objects.count() - before
+                if amount:
+                    bump_catalog_version()
                 print(
                     f'Добавлено {amount} '
                     f'{self.model._meta.verbose_name} '
@@ -22,3 +37,15 @@ class LoadJson(BaseCommand):
                 )
         except Exception as e:
             print(f'Ошибка при работе с файлом {self.filename}: {e}')
+
+    def sync(self, file):
+        result = CatalogSync(
+            self.model, self.key_fields, self.match_field
+        ).sync(iter_json_array(file))
+        if result.changed:
+            bump_catalog_version()
+        print(
+            f'{self.model._meta.verbose_name_plural} из файла '
+            f'{self.filename}: добавлено {result.inserted}, '
+            f'обновлено {result.updated}, без изменений {result.unchanged}.'
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes import shopping_list
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает таблицу списков покупок из корзин '
+        'или сверяет её с актуальными суммами (--verify).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только сверить таблицу, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            amount = shopping_list.rebuild()
+            print(f'Списки покупок пересобраны: {amount} строк.')
+            return
+        mismatches = shopping_list.find_mismatches()
+        if mismatches:
+            for user_id, ingredient_id in mismatches[:20]:
+                print(
+                    f'Расхождение: пользователь {user_id}, '
+                    f'продукт {ingredient_id}'
+                )
+            raise CommandError(
+                f'Найдено расхождений: {len(mismatches)}.'
+            )
+        print('Списки покупок совпадают с корзинами.')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики рецептов, подписок и избранного.'
+
+    def handle(self, *args, **options):
+        for (model_name, field), amount in reconcile().items():
+            if amount:
+                print(f'{model_name}.{field}: исправлено {amount}')
+        print('Счётчики сверены.')
@@ -0,0 +1,90 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.catalog import bump_catalog_version
+from recipes import shopping_list
+from recipes.counters import reconcile
+from recipes.models import Favorite, ShoppingCart, Subscribe
+from recipes.seed import BATCH_SIZE, PASSWORD, Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу детерминированными тестовыми данными: '
+        'пользователями, рецептами, избранным, корзинами и подписками.'
+    )
+
+    def add_arguments(self, parser):
+        for name, default, help_text in (
+            ('users', 1000, 'Число пользователей.'),
+            ('recipes', 10000, 'Число рецептов.'),
+            ('max-ingredients', 15, 'Наибольшее число продуктов в рецепте.'),
+            ('tags', 10, 'Сколько тегов должно быть в базе.'),
+            ('ingredients', 2000, 'Сколько продуктов должно быть в базе.'),
+            ('favorites', 50000, 'Число записей в избранном.'),
+            ('carts', 20000, 'Число рецептов в корзинах.'),
+            ('subscriptions', 20000, 'Число подписок.'),
+            ('days', 365, 'За сколько дней распределить даты рецептов.'),
+            ('seed', 0, 'Начальное значение генератора.'),
+            ('batch-size', BATCH_SIZE, 'Размер пачки при вставке.'),
+        ):
+            parser.add_argument(
+                f'--{name}', type=int, default=default, help=help_text
+            )
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного распределения популярности.',
+        )
+        parser.add_argument(
+            '--prefix', default='seed',
+            help='Префикс логинов создаваемых пользователей.',
+        )
+
+    def handle(self, *args, **options):
+        seeder = Seeder(
+            seed=options['seed'],
+            prefix=options['prefix'],
+            alpha=options['alpha'],
+            batch_size=options['batch_size'],
+        )
+        if seeder.users().exists():
+            raise CommandError(
+                f'Пользователи с префиксом {options["prefix"]} уже есть, '
+                'укажите другой --prefix.'
+            )
+        started = time.monotonic()
+        tags = seeder.create_tags(options['tags'])
+        ingredients = seeder.create_ingredients(options['ingredients'])
+        users = seeder.create_users(options['users'])
+        try:
+            recipes = seeder.create_recipes(
+                options['recipes'], users, tags, ingredients,
+                options['max_ingredients'], options['days'],
+                seeder.create_image(),
+            )
+        except ValueError as error:
+            raise CommandError(f'Ошибка при создании рецептов: {error}')
+        user_ids = [user_id for user_id, _ in users]
+        created = {
+            model: seeder.create_pairs(
+                model, field, options[option], user_ids, targets
+            )
+            for model, field, option, targets in (
+                (Favorite, 'recipe_id', 'favorites', recipes),
+                (ShoppingCart, 'recipe_id', 'carts', recipes),
+                (Subscribe, 'author_id', 'subscriptions', user_ids),
+            )
+        }
+        shopping_list.rebuild(seeder.users())
+        reconcile()
+        bump_catalog_version()
+        print(
+            f'Создано за {time.monotonic() - started:.0f} с: '
+            f'пользователей {len(users)}, рецептов {len(recipes)}, '
+            + ', '.join(
+                f'{model._meta.verbose_name_plural.lower()} {amount}'
+                for model, amount in created.items()
+            )
+            + f'. Пароль пользователей: {PASSWORD}.'
+        )
@@ -1,7 +1,10 @@
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 
+from recipes.search import update_search_vectors
+
 
 MAX_LENGTH = 50
 MAX_LENGTH_MEASUREMENT_UNIT = 64
@@ -13,7 +16,35 @@ MIN_TIME = 1
 MIN_AMOUNT = 1
 
 
-class User(AbstractUser):
+class CountersMixin:
+    """Сохранение без перезаписи счётчиков.
+
+    Счётчики меняются сигналами одним UPDATE с F(), а объект в памяти
+    хранит значения на момент загрузки. Поэтому save() существующей
+    записи без update_fields пишет все загруженные поля, кроме
+    counter_fields.
+    """
+
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if (
+            not args
+            and not self._state.adding
+            and kwargs.get('update_fields') is None
+            and not kwargs.get('force_insert')
+        ):
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(*args, **kwargs)
+
+
+class User(CountersMixin, AbstractUser):
     """Модель пользователя."""
 
     email = models.EmailField(
@@ -44,7 +75,25 @@ class User(AbstractUser):
         verbose_name='Аватар',
         blank=True
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
+    subscriptions_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписок',
+    )
 
+    counter_fields = (
+        'recipes_count', 'subscribers_count', 'subscriptions_count',
+    )
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ('username', 'first_name', 'last_name')
 
@@ -88,7 +137,7 @@ class Subscribe(models.Model):
         return f'{self.user} подписчик {self.author}'
 
 
-class Tag(models.Model):
+class Tag(CountersMixin, models.Model):
     """Модель тега."""
 
     name = models.CharField(
@@ -100,6 +149,13 @@ class Tag(models.Model):
         unique=True,
         verbose_name='Слаг',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
+
+    counter_fields = ('recipes_count',)
 
     class Meta:
         verbose_name = 'Тег'
@@ -110,7 +166,7 @@ class Tag(models.Model):
         return self.name
 
 
-class Ingredient(models.Model):
+class Ingredient(CountersMixin, models.Model):
     """Модель ингредиента."""
 
     name = models.CharField(
@@ -121,6 +177,13 @@ class Ingredient(models.Model):
         max_length=MAX_LENGTH_MEASUREMENT_UNIT,
         verbose_name='Единица измерения',
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
+
+    counter_fields = ('recipes_count',)
 
     class Meta:
         verbose_name = 'Продукт'
@@ -137,7 +200,7 @@ class Ingredient(models.Model):
         return f'{self.name} /{self.measurement_unit}'
 
 
-class Recipe(models.Model):
+class Recipe(CountersMixin, models.Model):
     """Модель рецепта."""
 
     name = models.CharField(
@@ -170,16 +233,49 @@ class Recipe(models.Model):
         verbose_name='Теги',
     )
     pub_date = models.DateTimeField(auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок',
+    )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+
+    counter_fields = ('favorites_count', 'cart_count')
 
     class Meta:
         ordering = ('-pub_date',)
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='recipe_pub_date_id_idx',
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or {'name', 'text'} & set(update_fields):
+            update_search_vectors(Recipe.objects.filter(pk=self.pk))
+
 
 class RecipeIngredient(models.Model):
     """Модель рецепт-ингредиент."""
@@ -250,3 +346,43 @@ class ShoppingCart(BaseUserRecipesModel):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
         default_related_name = 'shopping_carts'
+
+
+class ShoppingListItem(models.Model):
+    """Модель продукта в списке покупок пользователя.
+
+    Хранит суммарное количество продукта по всем рецептам из корзины
+    пользователя и число этих рецептов. Поддерживается обработчиками
+    сигналов из recipes.shopping_list.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Продукт',
+    )
+    total_amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+    recipe_count = models.PositiveIntegerField(
+        verbose_name='Рецептов',
+    )
+
+    class Meta:
+        default_related_name = 'shopping_list_items'
+        verbose_name = 'Продукт в списке покупок'
+        verbose_name_plural = 'Продукты в списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_ingredient',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient}'
@@ -0,0 +1,94 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from PIL import Image
+
+from jobs.queue import enqueue
+from recipes.models import Recipe, User
+
+
+def rendition_name(name, size):
+    """Имя производного файла рядом с оригиналом: photo.small.webp."""
+    return f'{os.path.splitext(name)[0]}.{size}.webp'
+
+
+def rendition_names(name):
+    return [rendition_name(name, size) for size in settings.IMAGE_RENDITIONS]
+
+
+def ready_rendition(field_file, size):
+    """Имя готового производного файла или None, если его ещё нет."""
+    if size not in settings.IMAGE_RENDITIONS or not field_file:
+        return None
+    name = rendition_name(field_file.name, size)
+    if field_file.storage.exists(name):
+        return name
+    return None
+
+
+def make_renditions(name, storage=default_storage):
+    """Создаёт недостающие копии изображения в формате WebP.
+
+    Имена загруженных изображений уникальны, поэтому существующая копия
+    всегда соответствует оригиналу и повторно не создаётся.
+    """
+    missing = {
+        size: max_side
+        for size, max_side in settings.IMAGE_RENDITIONS.items()
+        if not storage.exists(rendition_name(name, size))
+    }
+    if not missing:
+        return
+    with storage.open(name) as file, Image.open(file) as image:
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        for size, max_side in missing.items():
+            rendition = image.copy()
+            if max_side:
+                rendition.thumbnail((max_side, max_side))
+            content = BytesIO()
+            rendition.save(
+                content, 'WEBP', quality=settings.IMAGE_RENDITION_QUALITY
+            )
+            storage.save(
+                rendition_name(name, size), ContentFile(content.getvalue())
+            )
+
+
+def schedule_renditions(field_file):
+    """Ставит создание копий изображения в очередь фоновых задач."""
+    if not field_file:
+        return
+    enqueue(
+        'recipes.make_renditions',
+        {'name': field_file.name},
+        idempotency_key=f'renditions:{field_file.name}',
+    )
+
+
+def schedule_deletion(field_file):
+    """Ставит удаление файла вместе с его копиями в очередь задач."""
+    if not field_file:
+        return
+    enqueue(
+        'recipes.delete_files',
+        {'names': [field_file.name, *rendition_names(field_file.name)]},
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, update_fields=None, **kwargs):
+    if update_fields is None or 'image' in update_fields:
+        schedule_renditions(instance.image)
+
+
+@receiver(post_save, sender=User)
+def user_saved(instance, update_fields=None, **kwargs):
+    if update_fields is None or 'avatar' in update_fields:
+        schedule_renditions(instance.avatar)
@@ -0,0 +1,67 @@
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection
+from django.db.models import F, FloatField, Value
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+# Вес совпадений в названии (A) и в описании (B) - одинаковый для
+# SearchRank в PostgreSQL и bm25 в SQLite, чтобы порядок совпадал.
+NAME_WEIGHT = 1.0
+TEXT_WEIGHT = 0.4
+
+
+def search_vector():
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def update_search_vectors(recipes):
+    """Обновляет поисковый вектор рецептов в PostgreSQL.
+
+    В SQLite индекс FTS5 обновляется триггерами, вызов ничего не делает.
+    """
+    if connection.vendor == 'postgresql':
+        recipes.update(search_vector=search_vector())
+
+
+def fts_query(query):
+    """Запрос FTS5 из слов пользователя: каждое слово в кавычках."""
+    return ' '.join(
+        '"{}"'.format(word.replace('"', '""'))
+        for word in re.findall(r'\w+', query)
+    )
+
+
+def search_recipes(recipes, query):
+    """Рецепты, подходящие под запрос, с аннотацией search_rank."""
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(
+            query, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        return recipes.filter(search_vector=search_query).annotate(
+            search_rank=SearchRank(
+                F('search_vector'), search_query,
+                weights=[0.1, 0.2, TEXT_WEIGHT, NAME_WEIGHT],
+            )
+        )
+    if connection.vendor == 'sqlite':
+        query = fts_query(query)
+        if not query:
+            return recipes.annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            ).none()
+        table = recipes.model._meta.db_table
+        return recipes.annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, %s, %s) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+            (NAME_WEIGHT, TEXT_WEIGHT, query),
+        )).filter(search_rank__isnull=False)
+    return recipes.filter(name__icontains=query).annotate(
+        search_rank=Value(1.0, output_field=FloatField())
+    )
@@ -0,0 +1,200 @@
+import random
+from datetime import datetime, timedelta, timezone
+from io import BytesIO
+from itertools import accumulate, islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image
+
+from recipes.models import Ingredient, Recipe, Subscribe, Tag, User
+from recipes.renditions import make_renditions
+from recipes.transfer import RecipeImporter
+
+BATCH_SIZE = 5000
+PASSWORD = 'seed-password'
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+IMAGE_SIZE = (600, 400)
+IMAGE_COLOR = (230, 160, 80)
+WORDS = (
+    'борщ', 'салат', 'суп', 'пирог', 'каша', 'котлеты', 'плов', 'блины',
+    'запеканка', 'рагу', 'омлет', 'паста', 'соус', 'торт', 'хлеб',
+    'курица', 'говядина', 'рыба', 'грибы', 'картофель', 'капуста',
+    'морковь', 'сыр', 'творог', 'яблоки', 'ягоды', 'рис', 'гречка',
+    'домашний', 'быстрый', 'летний', 'зимний', 'острый', 'сладкий',
+    'праздничный', 'постный', 'сытный', 'лёгкий', 'запечённый',
+)
+
+
+def zipf_weights(size, alpha):
+    """Накопленные веса степенного закона: ранг r получает 1 / r^alpha."""
+    return list(accumulate(1 / rank ** alpha for rank in range(1, size + 1)))
+
+
+def batches(items, size):
+    items = iter(items)
+    while True:
+        batch = list(islice(items, size))
+        if not batch:
+            return
+        yield batch
+
+
+class Seeder:
+    """Детерминированный генератор данных для нагрузочных проверок.
+
+    При одном и том же seed и одинаковой базе до запуска получаются
+    одни и те же данные. Число рецептов у автора, подписчиков у автора
+    и популярность рецептов в избранном и корзинах распределены по
+    степенному закону с показателем alpha.
+    """
+
+    def __init__(self, seed=0, prefix='seed', alpha=1.1,
+                 batch_size=BATCH_SIZE, report=print):
+        self.random = random.Random(seed)
+        self.prefix = prefix
+        self.alpha = alpha
+        self.batch_size = batch_size
+        self.report = report
+
+    def users(self):
+        return User.objects.filter(username__startswith=f'{self.prefix}_')
+
+    def popular(self, items):
+        """Функция выбора k элементов: первые в списке - самые частые."""
+        weights = zipf_weights(len(items), self.alpha)
+        return lambda k: self.random.choices(items, cum_weights=weights, k=k)
+
+    def ranked(self, items):
+        """Копия списка в случайном порядке: ранг не зависит от id."""
+        items = list(items)
+        self.random.shuffle(items)
+        return items
+
+    def create_image(self):
+        """Одно изображение с копиями всех размеров для всех рецептов."""
+        content = BytesIO()
+        Image.new('RGB', IMAGE_SIZE, IMAGE_COLOR).save(content, 'PNG')
+        name = default_storage.save(
+            f'recipes/{self.prefix}.png', ContentFile(content.getvalue())
+        )
+        make_renditions(name)
+        return name
+
+    def create_tags(self, amount):
+        existing = Tag.objects.count()
+        Tag.objects.bulk_create([
+            Tag(name=f'{self.prefix}-тег-{number}',
+                slug=f'{self.prefix}-tag-{number}')
+            for number in range(existing, amount)
+        ])
+        return list(Tag.objects.order_by('id').values_list('slug', flat=True))
+
+    def create_ingredients(self, amount):
+        existing = Ingredient.objects.count()
+        Ingredient.objects.bulk_create([
+            Ingredient(name=f'{self.prefix}-продукт-{number}',
+                       measurement_unit='г')
+            for number in range(existing, amount)
+        ])
+        return list(
+            Ingredient.objects.order_by('id')
+            .values_list('name', 'measurement_unit')
+        )
+
+    def create_users(self, amount):
+        password = make_password(PASSWORD, salt=self.prefix)
+        for batch in batches(range(amount), self.batch_size):
+            User.objects.bulk_create([
+                User(
+                    username=f'{self.prefix}_{number:07d}',
+                    email=f'{self.prefix}_{number:07d}@example.com',
+                    first_name=self.random.choice(WORDS).capitalize(),
+                    last_name=self.random.choice(WORDS).capitalize(),
+                    password=password,
+                )
+                for number in batch
+            ])
+            self.report(f'Пользователи: {batch[-1] + 1} из {amount}.')
+        return list(
+            self.users().order_by('id').values_list('id', 'username')
+        )
+
+    def recipe(self, author, tags, ingredients, max_ingredients, days,
+               image):
+        return {
+            'name': ' '.join(self.random.sample(WORDS, 3)).capitalize(),
+            'text': ' '.join(self.random.choices(WORDS, k=30)),
+            'image': image,
+            'cooking_time': self.random.randint(5, 180),
+            'pub_date': (
+                EPOCH - timedelta(seconds=self.random.randrange(days * 86400))
+            ).isoformat(),
+            'author': author,
+            'tags': sorted(set(
+                self.random.choices(tags, k=self.random.randint(1, 3))
+            )),
+            'ingredients': [
+                {'name': name, 'measurement_unit': unit,
+                 'amount': self.random.randint(1, 500)}
+                for name, unit in sorted(set(
+                    ingredients(self.random.randint(1, max_ingredients))
+                ))
+            ],
+        }
+
+    def create_recipes(self, amount, users, tags, ingredients,
+                       max_ingredients, days, image):
+        authors = self.popular(self.ranked(
+            username for _, username in users
+        ))
+        ingredients = self.popular(self.ranked(ingredients))
+        importer = RecipeImporter()
+        done = 0
+        for batch in batches(range(amount), self.batch_size):
+            errors = importer.import_batch([
+                self.recipe(
+                    author, tags, ingredients, max_ingredients, days, image
+                )
+                for author in authors(len(batch))
+            ])
+            if errors:
+                raise ValueError(errors[0][1])
+            done += len(batch)
+            self.report(f'Рецепты: {done} из {amount}.')
+        return list(
+            Recipe.objects.filter(author__in=self.users())
+            .order_by('id').values_list('id', flat=True)
+        )
+
+    def create_pairs(self, model, field, amount, users, targets):
+        """Связи пользователей с рецептами или авторами.
+
+        Пользователь выбирается равномерно, объект - по степенному
+        закону. Повторы пропускаются, поэтому строк может оказаться
+        немного меньше amount.
+        """
+        before = model.objects.count()
+        targets = self.popular(self.ranked(targets))
+        for batch in batches(range(amount), self.batch_size):
+            pairs = {
+                (user_id, target_id)
+                for user_id, target_id in zip(
+                    self.random.choices(users, k=len(batch)),
+                    targets(len(batch)),
+                )
+                if user_id != target_id or model is not Subscribe
+            }
+            model.objects.bulk_create(
+                [
+                    model(user_id=user_id, **{field: target_id})
+                    for user_id, target_id in sorted(pairs)
+                ],
+                ignore_conflicts=True,
+            )
+            self.report(
+                f'{model._meta.verbose_name_plural}: '
+                f'{batch[-1] + 1} из {amount}.'
+            )
+        return model.objects.count() - before
@@ -0,0 +1,361 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Sum
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipes.deletion import deleted_ids, handled, origin_state
+from recipes.models import (RecipeIngredient, ShoppingCart, ShoppingListItem,
+                            User)
+
+BATCH_SIZE = 1000
+# Сколько раз повторить изменение, если параллельная транзакция успела
+# добавить ту же строку списка покупок.
+RETRIES = 3
+
+
+def recipe_amounts(recipe):
+    """Количество каждого продукта рецепта: {ingredient_id: amount}."""
+    return dict(
+        RecipeIngredient.objects.filter(recipe=recipe)
+        .values_list('ingredient_id', 'amount')
+    )
+
+
+def apply_changes(user_ids, changes):
+    """Применяет одинаковые изменения к спискам покупок пользователей.
+
+    changes - {ingredient_id: (изменение количества, изменение числа
+    рецептов)}.
+    """
+    apply_user_changes({
+        (user_id, ingredient_id): change
+        for user_id in user_ids
+        for ingredient_id, change in changes.items()
+    })
+
+
+def apply_user_changes(changes):
+    """Применяет изменения {(user_id, ingredient_id): (...)}.
+
+    Существующие строки блокируются и обновляются пакетно, строки без
+    рецептов удаляются. Если новую строку одновременно вставила другая
+    транзакция, изменение повторяется в точке сохранения - теперь уже
+    с блокировкой этой строки.
+    """
+    changes = {key: change for key, change in changes.items() if any(change)}
+    if not changes:
+        return
+    for attempt in range(RETRIES):
+        try:
+            with transaction.atomic():
+                write_changes(changes)
+            return
+        except IntegrityError:
+            if attempt == RETRIES - 1:
+                raise
+
+
+def write_changes(changes):
+    items = {
+        (item.user_id, item.ingredient_id): item
+        for item in ShoppingListItem.objects.select_for_update().filter(
+            user_id__in={user_id for user_id, _ in changes},
+            ingredient_id__in={ingredient_id for _, ingredient_id in changes},
+        )
+        if (item.user_id, item.ingredient_id) in changes
+    }
+    new_items = []
+    for (user_id, ingredient_id), (amount, recipes) in changes.items():
+        item = items.get((user_id, ingredient_id))
+        if item is None:
+            new_items.append(ShoppingListItem(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                total_amount=amount,
+                recipe_count=recipes,
+            ))
+            continue
+        item.total_amount += amount
+        item.recipe_count += recipes
+    empty = [item.id for item in items.values() if item.recipe_count <= 0]
+    ShoppingListItem.objects.bulk_update(
+        [item for item in items.values() if item.recipe_count > 0],
+        ('total_amount', 'recipe_count'),
+        batch_size=BATCH_SIZE,
+    )
+    ShoppingListItem.objects.filter(id__in=empty).delete()
+    ShoppingListItem.objects.bulk_create(
+        [item for item in new_items if item.recipe_count > 0],
+        batch_size=BATCH_SIZE,
+    )
+
+
+def add_recipe(user_id, recipe_id):
+    apply_changes([user_id], {
+        ingredient_id: (amount, 1)
+        for ingredient_id, amount in recipe_amounts(recipe_id).items()
+    })
+
+
+def remove_recipe(user_id, recipe_id):
+    apply_changes([user_id], {
+        ingredient_id: (-amount, -1)
+        for ingredient_id, amount in recipe_amounts(recipe_id).items()
+    })
+
+
+def change_recipe(recipe, old_amounts, new_amounts):
+    """Переносит изменение состава рецепта в списки покупок.
+
+    Затрагивает всех пользователей, у которых рецепт в корзине.
+    Пустой new_amounts означает удаление рецепта. Сохранение и удаление
+    отдельных корзин и продуктов рецепта учитывают обработчики сигналов
+    ниже, явный вызов нужен только после bulk_create и bulk_update.
+    """
+    changes = {}
+    for ingredient_id in old_amounts.keys() | new_amounts.keys():
+        old = old_amounts.get(ingredient_id)
+        new = new_amounts.get(ingredient_id)
+        changes[ingredient_id] = (
+            (new or 0) - (old or 0),
+            (new is not None) - (old is not None),
+        )
+    apply_changes(
+        ShoppingCart.objects.filter(recipe=recipe)
+        .values_list('user_id', flat=True),
+        changes,
+    )
+
+
+def live_totals(users=None):
+    """Актуальные суммы из корзин: {(user_id, ingredient_id): (...)}."""
+    if users is None:
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__shopping_carts__isnull=False
+        )
+    else:
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__shopping_carts__user__in=users
+        )
+    return {
+        (user_id, ingredient_id): (total_amount, recipe_count)
+        for user_id, ingredient_id, total_amount, recipe_count in (
+            ingredients.values_list(
+                'recipe__shopping_carts__user', 'ingredient'
+            )
+            .annotate(total_amount=Sum('amount'), recipe_count=Count('recipe'))
+            .order_by()
+            .iterator(chunk_size=BATCH_SIZE)
+        )
+    }
+
+
+def stored_totals(users=None):
+    items = ShoppingListItem.objects.all()
+    if users is not None:
+        items = items.filter(user__in=users)
+    return {
+        (user_id, ingredient_id): (total_amount, recipe_count)
+        for user_id, ingredient_id, total_amount, recipe_count in (
+            items.values_list(
+                'user_id', 'ingredient_id', 'total_amount', 'recipe_count'
+            ).iterator(chunk_size=BATCH_SIZE)
+        )
+    }
+
+
+def find_mismatches(users=None):
+    """Ключи (user_id, ingredient_id), где таблица расходится с корзинами."""
+    live = live_totals(users)
+    stored = stored_totals(users)
+    return sorted(
+        key for key in live.keys() | stored.keys()
+        if live.get(key) != stored.get(key)
+    )
+
+
+def rebuild(users=None):
+    """Пересчитывает списки покупок заново; возвращает число строк."""
+    with transaction.atomic():
+        items = ShoppingListItem.objects.all()
+        if users is not None:
+            items = items.filter(user__in=users)
+        items.delete()
+        return len(ShoppingListItem.objects.bulk_create(
+            (
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=total_amount,
+                    recipe_count=recipe_count,
+                )
+                for (user_id, ingredient_id), (total_amount, recipe_count)
+                in live_totals(users).items()
+            ),
+            batch_size=BATCH_SIZE,
+        ))
+
+
+class Deletion:
+    """Корзины и продукты рецептов, удаляемые одним delete().
+
+    Строки собираются обработчиками pre_delete, а первый post_delete
+    того же удаления применяет к спискам покупок одно общее изменение.
+    """
+
+    def __init__(self):
+        self.carts = {}
+        self.recipe_ingredients = {}
+        self.applied = False
+
+    def changes(self, deleted_users):
+        """Изменения {(user_id, ingredient_id): (...)} от удаления."""
+        changes = defaultdict(lambda: (0, 0))
+
+        def subtract(user_id, ingredient_id, amount):
+            total, recipes = changes[user_id, ingredient_id]
+            changes[user_id, ingredient_id] = total - amount, recipes - 1
+
+        carts = set(self.carts.values())
+        # Состав рецептов удаляемых корзин до удаления: продукты,
+        # удаляемые тем же delete(), могли уже исчезнуть из базы.
+        cart_recipes = {recipe_id for _, recipe_id in carts}
+        compositions = defaultdict(dict)
+        for pk, recipe_id, ingredient_id, amount in (
+            RecipeIngredient.objects.filter(recipe_id__in=cart_recipes)
+            .values_list('pk', 'recipe_id', 'ingredient_id', 'amount')
+            if cart_recipes else ()
+        ):
+            compositions[recipe_id][pk] = ingredient_id, amount
+        for pk, (recipe_id, ingredient_id, amount) in (
+            self.recipe_ingredients.items()
+        ):
+            if recipe_id in cart_recipes:
+                compositions[recipe_id][pk] = ingredient_id, amount
+        for user_id, recipe_id in carts:
+            if user_id not in deleted_users:
+                for ingredient_id, amount in (
+                    compositions[recipe_id].values()
+                ):
+                    subtract(user_id, ingredient_id, amount)
+        # Продукты, удалённые из рецептов, которые остались в корзинах.
+        holders = defaultdict(list)
+        for user_id, recipe_id in (
+            ShoppingCart.objects.filter(recipe_id__in={
+                recipe_id for recipe_id, _, _ in
+                self.recipe_ingredients.values()
+            }).values_list('user_id', 'recipe_id')
+            if self.recipe_ingredients else ()
+        ):
+            if (
+                (user_id, recipe_id) not in carts
+                and user_id not in deleted_users
+            ):
+                holders[recipe_id].append(user_id)
+        for recipe_id, ingredient_id, amount in (
+            self.recipe_ingredients.values()
+        ):
+            for user_id in holders[recipe_id]:
+                subtract(user_id, ingredient_id, amount)
+        return changes
+
+
+def pending_deletion(origin, deleted=False):
+    return origin_state(origin, 'shopping_list', Deletion, deleted)
+
+
+def apply_deletion(origin, deletion):
+    """Применяет изменение один раз на delete(), в первом post_delete."""
+    if deletion.applied:
+        return
+    deletion.applied = True
+    apply_user_changes(
+        deletion.changes(deleted_ids(origin, User, deleted=True))
+    )
+
+
+def previous_values(instance, *fields):
+    """Значения полей строки в базе до сохранения (None для новой)."""
+    if instance._state.adding or instance.pk is None:
+        return None
+    return type(instance).objects.filter(pk=instance.pk).values_list(
+        *fields
+    ).first()
+
+
+@receiver(pre_save, sender=ShoppingCart)
+def cart_saving(instance, **kwargs):
+    instance._shopping_list_old = previous_values(
+        instance, 'user_id', 'recipe_id'
+    )
+
+
+@receiver(post_save, sender=ShoppingCart)
+def cart_saved(instance, created, **kwargs):
+    old = None if created else instance._shopping_list_old
+    new = (instance.user_id, instance.recipe_id)
+    if old == new:
+        return
+    if old is not None:
+        remove_recipe(*old)
+    add_recipe(*new)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def cart_deleting(instance, origin=None, **kwargs):
+    pending_deletion(origin).carts[instance.pk] = (
+        instance.user_id, instance.recipe_id
+    )
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def cart_deleted(instance, origin=None, **kwargs):
+    deletion = pending_deletion(origin, deleted=True)
+    if origin is None:
+        deletion.carts[instance.pk] = instance.user_id, instance.recipe_id
+    apply_deletion(origin, deletion)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(instance, **kwargs):
+    instance._shopping_list_old = previous_values(
+        instance, 'recipe_id', 'ingredient_id', 'amount'
+    )
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(instance, created, **kwargs):
+    old = None if created else instance._shopping_list_old
+    new = (instance.recipe_id, instance.ingredient_id, instance.amount)
+    if old == new:
+        return
+    if old is not None and old[0] != new[0]:
+        change_recipe(old[0], {old[1]: old[2]}, {})
+        old = None
+    change_recipe(
+        new[0], {} if old is None else {old[1]: old[2]}, {new[1]: new[2]}
+    )
+
+
+@receiver(pre_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleting(instance, origin=None, **kwargs):
+    if handled(origin):
+        return
+    pending_deletion(origin).recipe_ingredients[instance.pk] = (
+        instance.recipe_id, instance.ingredient_id, instance.amount
+    )
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(instance, origin=None, **kwargs):
+    if handled(origin):
+        return
+    deletion = pending_deletion(origin, deleted=True)
+    if origin is None:
+        deletion.recipe_ingredients[instance.pk] = (
+            instance.recipe_id, instance.ingredient_id, instance.amount
+        )
+    apply_deletion(origin, deletion)
@@ -0,0 +1,149 @@
+import json
+from collections import defaultdict
+from itertools import islice
+
+from django.db import connection, transaction
+
+BATCH_SIZE = 1000
+
+
+def iter_json_array(file, chunk_size=64 * 1024):
+    """Элементы JSON-массива из файла по одному, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(chunk_size).lstrip()
+    if not buffer.startswith('['):
+        raise ValueError('Ожидается JSON-массив.')
+    buffer = buffer[1:]
+    eof = False
+    while True:
+        buffer = buffer.lstrip().lstrip(',').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except ValueError:
+            item, end = None, None
+        if end is None or end == len(buffer) and not eof:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                if eof:
+                    raise ValueError('Файл закончился внутри массива.')
+                eof = True
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+class CatalogSync:
+    """Синхронизация справочника с источником пачками.
+
+    Строки источника сравниваются со словарём ключ -> id, загруженным
+    одним запросом. Вставляются только новые строки, обновляются только
+    изменённые. Если ключа нет, но есть ровно одна строка с тем же
+    match_field, которой нет в источнике, она обновляется: так
+    переименованная единица измерения меняется у существующего продукта.
+    """
+
+    def __init__(self, model, key_fields, match_field,
+                 batch_size=BATCH_SIZE):
+        self.model = model
+        self.fields = tuple(
+            field.name for field in model._meta.concrete_fields
+            if field.editable and not field.primary_key
+        )
+        self.key_fields = key_fields
+        self.match_field = match_field
+        self.batch_size = batch_size
+        self.keys = {}
+        self.values = {}
+        self.matches = defaultdict(list)
+        for row in model.objects.values('pk', *self.fields).iterator():
+            self.remember(row.pop('pk'), row)
+        self.seen = set()
+        self.deferred = []
+        self.inserted = self.updated = self.unchanged = 0
+
+    def remember(self, pk, values):
+        self.keys[self.key(values)] = pk
+        self.values[pk] = values
+        self.matches[values[self.match_field]].append(pk)
+
+    def key(self, values):
+        return tuple(values[field] for field in self.key_fields)
+
+    @property
+    def changed(self):
+        return self.inserted + self.updated
+
+    def sync(self, rows):
+        """Синхронизирует строки-словари и возвращает self со счётчиками."""
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                break
+            inserts, updates = [], []
+            for row in batch:
+                values = {field: row[field] for field in self.fields}
+                pk = self.keys.get(self.key(values))
+                if pk is not None:
+                    self.seen.add(pk)
+                    if self.values[pk] == values:
+                        self.unchanged += 1
+                    else:
+                        updates.append((pk, values))
+                elif self.matches.get(values[self.match_field]):
+                    self.deferred.append(values)
+                else:
+                    inserts.append(values)
+            self.save(inserts, updates)
+        self.save(*self.resolve_deferred())
+        return self
+
+    def resolve_deferred(self):
+        """Строки, отложенные до конца источника, когда все ключи видны."""
+        groups = defaultdict(list)
+        for values in self.deferred:
+            groups[values[self.match_field]].append(values)
+        self.deferred = []
+        inserts, updates = [], []
+        for match, group in groups.items():
+            free = [pk for pk in self.matches[match] if pk not in self.seen]
+            if len(free) == 1 and len(group) == 1:
+                updates.append((free[0], group[0]))
+            else:
+                inserts.extend(group)
+        return inserts, updates
+
+    def save(self, inserts, updates):
+        unique = list({self.key(row): row for row in inserts}.values())
+        updates = list(dict(updates).items())
+        self.unchanged += len(inserts) - len(unique)
+        inserts = unique
+        if not inserts and not updates:
+            return
+        with transaction.atomic():
+            created = self.model.objects.bulk_create(
+                [self.model(**values) for values in inserts]
+            )
+            objects = [self.model(pk=pk, **values) for pk, values in updates]
+            if connection.features.supports_update_conflicts_with_target:
+                self.model.objects.bulk_create(
+                    objects,
+                    update_conflicts=True,
+                    unique_fields=(self.model._meta.pk.name,),
+                    update_fields=self.fields,
+                )
+            else:
+                self.model.objects.bulk_update(objects, self.fields)
+        for obj, values in zip(created, inserts):
+            self.remember(obj.pk, values)
+            self.seen.add(obj.pk)
+        for pk, values in updates:
+            del self.keys[self.key(self.values[pk])]
+            self.matches[self.values[pk][self.match_field]].remove(pk)
+            self.remember(pk, values)
+            self.seen.add(pk)
+        self.inserted += len(inserts)
+        self.updated += len(updates)
@@ -0,0 +1,15 @@
+from django.core.files.storage import default_storage
+
+from jobs.queue import task
+from recipes.renditions import make_renditions
+
+
+@task('recipes.make_renditions')
+def make_renditions_task(name):
+    make_renditions(name)
+
+
+@task('recipes.delete_files')
+def delete_files(names):
+    for name in names:
+        default_storage.delete(name)
@@ -0,0 +1,68 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            Subscribe, Tag, User)
+
+# Запросы страницы списка в админке: сессия, пользователь, COUNT для
+# пагинации и общего числа, сама страница, prefetch_related и значения
+# для фильтров.
+CHANGELIST_QUERIES = {
+    'recipe': 8,
+    'tag': 5,
+    'ingredient': 6,
+    'user': 5,
+}
+
+
+class AdminChangelistQueriesTest(TestCase):
+    """Число запросов страниц списков в админке не зависит от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='admin',
+        )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def add_rows(self, start, amount):
+        for number in range(start, start + amount):
+            user = User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                avatar='avatars/avatar.png',
+            )
+            tag = Tag.objects.create(name=f'тег{number}', slug=f'tag{number}')
+            ingredient = Ingredient.objects.create(
+                name=f'продукт{number}', measurement_unit='г',
+            )
+            recipe = Recipe.objects.create(
+                author=user, name=f'рецепт{number}', text='текст',
+                cooking_time=10,
+                image='' if number % 2 else 'recipes/recipe.png',
+            )
+            recipe.tags.set([tag])
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=number + 1,
+            )
+            Favorite.objects.create(user=user, recipe=recipe)
+            Subscribe.objects.create(user=self.admin, author=user)
+
+    def changelist_queries(self, model):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(f'/admin/recipes/{model}/')
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def test_changelist_queries(self):
+        self.add_rows(0, 2)
+        for model, queries in CHANGELIST_QUERIES.items():
+            with self.subTest(model=model):
+                with self.assertNumQueries(queries):
+                    self.client.get(f'/admin/recipes/{model}/')
+        self.add_rows(2, 30)
+        for model, queries in CHANGELIST_QUERIES.items():
+            with self.subTest(model=model):
+                self.assertEqual(self.changelist_queries(model), queries)
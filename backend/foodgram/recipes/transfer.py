@@ -0,0 +1,277 @@
+import csv
+import io
+import json
+import os
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag, User
+from recipes.search import update_search_vectors
+
+BATCH_SIZE = 1000
+RECIPE_COLUMNS = (
+    'name', 'text', 'image', 'author_id', 'cooking_time', 'pub_date',
+    'favorites_count', 'cart_count',
+)
+
+
+class RecordError(Exception):
+    """Запись файла импорта не может быть загружена."""
+
+
+def export_batches(batch_size=BATCH_SIZE):
+    """Рецепты пачками словарей для JSONL, в порядке id.
+
+    Ссылки на автора, теги и продукты записываются естественными
+    ключами, чтобы файл можно было загрузить в другую базу. На пачку
+    приходится три запроса, память не зависит от числа рецептов.
+    """
+    last_id = 0
+    while True:
+        recipes = list(
+            Recipe.objects.filter(id__gt=last_id).order_by('id').values(
+                'id', 'name', 'text', 'image', 'cooking_time', 'pub_date',
+                'author__username',
+            )[:batch_size]
+        )
+        if not recipes:
+            return
+        ids = [recipe['id'] for recipe in recipes]
+        tags = {recipe_id: [] for recipe_id in ids}
+        for recipe_id, slug in (
+            Recipe.tags.through.objects.filter(recipe_id__in=ids)
+            .order_by('tag_id').values_list('recipe_id', 'tag__slug')
+        ):
+            tags[recipe_id].append(slug)
+        ingredients = {recipe_id: [] for recipe_id in ids}
+        for recipe_id, name, unit, amount in (
+            RecipeIngredient.objects.filter(recipe_id__in=ids)
+            .order_by('id').values_list(
+                'recipe_id', 'ingredient__name',
+                'ingredient__measurement_unit', 'amount',
+            )
+        ):
+            ingredients[recipe_id].append({
+                'name': name, 'measurement_unit': unit, 'amount': amount,
+            })
+        yield [
+            {
+                'id': recipe['id'],
+                'name': recipe['name'],
+                'text': recipe['text'],
+                'image': recipe['image'],
+                'cooking_time': recipe['cooking_time'],
+                'pub_date': recipe['pub_date'].isoformat(),
+                'author': recipe['author__username'],
+                'tags': tags[recipe['id']],
+                'ingredients': ingredients[recipe['id']],
+            }
+            for recipe in recipes
+        ]
+        last_id = ids[-1]
+
+
+def parse_pub_date(value):
+    """Дата публикации из ISO 8601; без даты - текущее время."""
+    if value is None:
+        return timezone.now()
+    pub_date = parse_datetime(value)
+    if pub_date is None:
+        raise ValueError(f'дата {value!r}')
+    if timezone.is_naive(pub_date):
+        pub_date = timezone.make_aware(pub_date)
+    return pub_date
+
+
+class RecipeImporter:
+    """Загружает рецепты из словарей формата export_batches.
+
+    Теги и продукты сопоставляются со своими id по словарям в памяти,
+    авторы - одним запросом на пачку. В PostgreSQL строки пишутся
+    командой COPY, в остальных базах - через bulk_create. Сигналы
+    не отправляются: счётчики пересчитываются после загрузки, а
+    поисковый вектор обновляется в каждой пачке.
+    """
+
+    def __init__(self):
+        self.tags = dict(Tag.objects.values_list('slug', 'id'))
+        self.ingredients = {
+            (name, unit): pk for pk, name, unit in
+            Ingredient.objects.values_list('id', 'name', 'measurement_unit')
+        }
+        self.use_copy = connection.vendor == 'postgresql'
+
+    def parse(self, data, authors):
+        """Кортеж (поля рецепта, id тегов, [(id продукта, количество)])."""
+        try:
+            author_id = authors.get(data['author'])
+            if author_id is None:
+                raise RecordError(f'Нет пользователя {data["author"]!r}.')
+            tag_ids = set()
+            for slug in data['tags']:
+                if slug not in self.tags:
+                    raise RecordError(f'Нет тега {slug!r}.')
+                tag_ids.add(self.tags[slug])
+            amounts = {}
+            for item in data['ingredients']:
+                key = item['name'], item['measurement_unit']
+                if key not in self.ingredients:
+                    raise RecordError(f'Нет продукта {key[0]!r}.')
+                amounts[self.ingredients[key]] = int(item['amount'])
+            fields = {
+                'name': str(data['name']),
+                'text': str(data['text']),
+                'image': str(data['image']),
+                'author_id': author_id,
+                'cooking_time': int(data['cooking_time']),
+                'pub_date': parse_pub_date(data.get('pub_date')),
+                'favorites_count': 0,
+                'cart_count': 0,
+            }
+        except (KeyError, TypeError, ValueError) as error:
+            raise RecordError(f'Неверная запись: {error!r}.')
+        if fields['cooking_time'] < 1 or min(amounts.values(), default=1) < 1:
+            raise RecordError('Время и количество должны быть больше нуля.')
+        if not tag_ids or not amounts:
+            raise RecordError('Нужен хотя бы один тег и один продукт.')
+        if not fields['image']:
+            raise RecordError('Нет изображения.')
+        return fields, tag_ids, list(amounts.items())
+
+    def import_batch(self, batch):
+        """Загружает пачку словарей в одной транзакции.
+
+        Возвращает список (номер записи в пачке, ошибка) для пропущенных.
+        """
+        authors = dict(
+            User.objects.filter(
+                username__in={
+                    data.get('author') for data in batch
+                    if isinstance(data, dict)
+                    and isinstance(data.get('author'), str)
+                }
+            ).values_list('username', 'id')
+        )
+        parsed, errors = [], []
+        for number, data in enumerate(batch):
+            try:
+                parsed.append(self.parse(data, authors))
+            except RecordError as error:
+                errors.append((number, error))
+        if not parsed:
+            return errors
+        with transaction.atomic():
+            if self.use_copy:
+                ids = self.copy_batch(parsed)
+            else:
+                ids = self.create_batch(parsed)
+            update_search_vectors(Recipe.objects.filter(id__in=ids))
+        return errors
+
+    def create_batch(self, parsed):
+        recipes = Recipe.objects.bulk_create(
+            [Recipe(**fields) for fields, _, _ in parsed]
+        )
+        for recipe, (fields, _, _) in zip(recipes, parsed):
+            recipe.pub_date = fields['pub_date']
+        Recipe.objects.bulk_update(recipes, ('pub_date',))
+        ids = [recipe.id for recipe in recipes]
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id, (_, tag_ids, _) in zip(ids, parsed)
+            for tag_id in tag_ids
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for recipe_id, (_, _, amounts) in zip(ids, parsed)
+            for ingredient_id, amount in amounts
+        ])
+        return ids
+
+    def copy_batch(self, parsed):
+        """Пишет пачку командой COPY с заранее выделенными id."""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+                'FROM generate_series(1, %s)',
+                (Recipe._meta.db_table, 'id', len(parsed)),
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+            copy_rows(
+                cursor, Recipe, ('id',) + RECIPE_COLUMNS,
+                (
+                    (recipe_id,) + tuple(
+                        fields[column] for column in RECIPE_COLUMNS
+                    )
+                    for recipe_id, (fields, _, _) in zip(ids, parsed)
+                ),
+            )
+            copy_rows(
+                cursor, Recipe.tags.through, ('recipe_id', 'tag_id'),
+                (
+                    (recipe_id, tag_id)
+                    for recipe_id, (_, tag_ids, _) in zip(ids, parsed)
+                    for tag_id in tag_ids
+                ),
+            )
+            copy_rows(
+                cursor, RecipeIngredient,
+                ('recipe_id', 'ingredient_id', 'amount'),
+                (
+                    (recipe_id, ingredient_id, amount)
+                    for recipe_id, (_, _, amounts) in zip(ids, parsed)
+                    for ingredient_id, amount in amounts
+                ),
+            )
+        return ids
+
+
+def copy_rows(cursor, model, columns, rows):
+    """COPY строк в таблицу модели через psycopg2 в формате CSV.
+
+    Строки берутся в кавычки, поэтому пустая строка не станет NULL.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_NONNUMERIC)
+    for row in rows:
+        writer.writerow([
+            value.isoformat() if hasattr(value, 'isoformat') else value
+            for value in row
+        ])
+    buffer.seek(0)
+    cursor.cursor.copy_expert(
+        'COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+            connection.ops.quote_name(model._meta.db_table),
+            ', '.join(connection.ops.quote_name(name) for name in columns),
+        ),
+        buffer,
+    )
+
+
+def read_checkpoint(path):
+    """Смещение, номер строки, число загруженных и пропущенных рецептов."""
+    try:
+        with open(path, encoding='utf-8') as file:
+            checkpoint = json.load(file)
+    except FileNotFoundError:
+        return 0, 0, 0, 0
+    return (
+        checkpoint['offset'], checkpoint['line'],
+        checkpoint.get('imported', 0), checkpoint.get('skipped', 0),
+    )
+
+
+def write_checkpoint(path, offset, line, imported=0, skipped=0):
+    """Атомарно заменяет файл отметки, чтобы сбой не оставил его пустым."""
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as file:
+        json.dump({
+            'offset': offset, 'line': line,
+            'imported': imported, 'skipped': skipped,
+        }, file)
+    os.replace(temporary, path)